@@ -2,9 +2,14 @@
 # Точка входа в проект.
 #
 # Запуск:
-#   python -m taskbot bot        -> запускает Telegram-бота (polling)
+#   python -m taskbot bot        -> запускает Telegram-бота (polling) и напоминания о сроках
 #   python -m taskbot db_init    -> создаёт таблицы в PostgreSQL (1 раз)
 #   python -m taskbot sync_once  -> делает одну синхронизацию outbox -> Google Sheets
+#   python -m taskbot archive    -> архивирует DONE задачи прошлых месяцев
+#   python -m taskbot outbox_retention -> удаляет старые обработанные события outbox
+#   python -m taskbot outbox_dead [task_id] -> показывает события в dead-letter (можно по задаче)
+#   python -m taskbot outbox_requeue [all|id,id,...] -> возвращает dead-letter события в очередь
+#   python -m taskbot import_sheets [--replace] -> переносит задачи из старой Google-таблицы в SQL
 #
 # Если аргумент не указан:
 #   python -m taskbot            -> эквивалент "bot"
@@ -17,7 +22,7 @@ import sys      # аргументы командной строки
 from aiogram import Bot  # объект бота
 from aiogram.enums import ParseMode  # режим разметки
 
-from taskbot.config import BOT_TOKEN  # токен бота из .env / окружения
+from taskbot.config import BOT_TOKEN, REMINDER_ENABLED  # токен бота и настройки из .env / окружения
 from taskbot.tg.handlers import build_dispatcher  # сборка роутеров/хендлеров
 
 from aiogram.client.default import DefaultBotProperties
@@ -28,14 +33,48 @@ from taskbot.storage.sql.init_db import init_db
 # один прогон синка (outbox -> google sheets)
 from taskbot.sync_worker import run_once
 
+# ежемесячная архивация DONE задач
+from taskbot.sheets.archiver import run_monthly_archive_once
+
+# очистка outbox (секции по месяцам)
+from taskbot.storage.sql.outbox_retention import outbox_retention
+
+# dead-letter очередь outbox
+from taskbot.storage.sql.outbox import outbox_dead_list, outbox_requeue
+
+# перенос данных из старой Google-таблицы в SQL
+from taskbot.sheets.backfill import import_sheets
+
+# справочник пользователей (кеш + LISTEN для сброса)
+from taskbot.storage.sql.users_directory import user_directory
+
+# фоновая проверка пула соединений
+from taskbot.storage.sql.db import pool_liveness_loop
+
+# напоминания о сроках
+from taskbot.tg.reminders import reminders_loop
+from taskbot.tg.middlewares import ReleaseReadSessionMiddleware
+
 
 async def run_bot() -> None:
     """
     Запускает Telegram-бота в режиме polling.
     """
     bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))  # создаём бота
+    bot.session.middleware(ReleaseReadSessionMiddleware())  # соединение чтения апдейта — в пул перед отправкой
     dp = build_dispatcher()  # собираем Dispatcher с роутерами
-    await dp.start_polling(bot)  # запускаем long polling
+
+    # сброс кеша пользователей по NOTIFY (изменения с других реплик)
+    users_listener = asyncio.create_task(user_directory.listen())
+    pool_checker = asyncio.create_task(pool_liveness_loop())
+    reminders = asyncio.create_task(reminders_loop(bot)) if REMINDER_ENABLED else None
+    try:
+        await dp.start_polling(bot)  # запускаем long polling
+    finally:
+        users_listener.cancel()
+        pool_checker.cancel()
+        if reminders is not None:
+            reminders.cancel()
 
 
 async def main() -> None:
@@ -59,12 +98,48 @@ async def main() -> None:
         print("✅ Sync once done.")
         return
 
+    if cmd == "archive":
+        total = await run_monthly_archive_once()
+        print(f"✅ Archive done ({total} tasks -> ARCHIVE).")
+        return
+
+    if cmd == "outbox_retention":
+        removed = await outbox_retention()
+        print(f"✅ Outbox retention done ({removed} events removed).")
+        return
+
+    if cmd == "outbox_dead":
+        arg = sys.argv[2].strip() if len(sys.argv) > 2 else ""
+        rows = await outbox_dead_list(task_id=int(arg) if arg.isdigit() else None)
+        if not rows:
+            print("Dead-letter queue is empty.")
+        for r in rows:
+            print(f"[{r.id}] {r.event_type} attempts={r.attempts} dead_at={r.dead_at}: {r.error}")
+        return
+
+    if cmd == "outbox_requeue":
+        arg = sys.argv[2].strip().lower() if len(sys.argv) > 2 else "all"
+        ids = None if arg == "all" else [int(x) for x in arg.split(",") if x.strip().isdigit()]
+        count = await outbox_requeue(ids)
+        print(f"✅ Requeued {count} events.")
+        return
+
+    if cmd == "import_sheets":
+        stats = await import_sheets(replace="--replace" in sys.argv[2:])
+        print("✅ Sheets import done:", ", ".join(f"{k}={v}" for k, v in stats.items()))
+        return
+
     # если команда неизвестна — выводим подсказку
     print("Unknown command.")
     print("Use one of:")
     print("  python -m taskbot bot")
     print("  python -m taskbot db_init")
     print("  python -m taskbot sync_once")
+    print("  python -m taskbot archive")
+    print("  python -m taskbot outbox_retention")
+    print("  python -m taskbot outbox_dead [task_id]")
+    print("  python -m taskbot outbox_requeue [all|id,id,...]")
+    print("  python -m taskbot import_sheets [--replace]")
 
 
 if __name__ == "__main__":
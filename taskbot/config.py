@@ -38,6 +38,75 @@ DATABASE_URL: str = os.getenv("DATABASE_URL", "").strip()
 if not DATABASE_URL:
     print("WARNING: DATABASE_URL is empty (check .env)")
 
+# Встроенный SQLite (sqlite+aiosqlite:///taskbot.db) для маленьких установок без сервера Postgres.
+# Без LISTEN/NOTIFY и SKIP LOCKED: воркер опрашивает outbox, записи идут по одной.
+IS_SQLITE: bool = DATABASE_URL.startswith("sqlite")
+# сколько ждать блокировку БД другим процессом (бот/воркер), мс
+SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# кеш страниц на соединение, КБ
+SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+
+# Реплика только для чтения (списки, отчёты); пусто — всё читаем с primary
+DATABASE_READ_URL: str = os.getenv("DATABASE_READ_URL", "").strip()
+# сколько секунд после своей записи пользователь читает с primary (read-your-writes)
+READ_YOUR_WRITES_SECONDS: float = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+# Пул соединений к БД (на процесс: бот и sync_worker считаются отдельно)
+DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# переоткрывать соединения старше N секунд (-1 — никогда)
+DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# pre-ping на каждую выдачу соединения — лишний round trip; по умолчанию вместо него фоновая проверка
+DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "0").strip() == "1"
+# фоновая проверка живости пула и лог метрик (сек); 0 — выключено
+DB_LIVENESS_INTERVAL: float = float(os.getenv("DB_LIVENESS_INTERVAL", "60"))
+DB_POOL_LOG_STATS: bool = os.getenv("DB_POOL_LOG_STATS", "0").strip() == "1"
+
+# Кеш подготовленных выражений asyncpg (на соединение)
+DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# 1 — работаем через PgBouncer в transaction/statement mode: без кеша prepared statements
+DB_PGBOUNCER: bool = os.getenv("DB_PGBOUNCER", "0").strip() == "1"
+# прямое подключение к Postgres в обход PgBouncer (для LISTEN); по умолчанию DATABASE_URL
+DATABASE_DIRECT_URL: str = os.getenv("DATABASE_DIRECT_URL", "").strip() or DATABASE_URL
+
+# Размер страницы в списках задач (keyset-пагинация)
+TASKS_PAGE_SIZE: int = int(os.getenv("TASKS_PAGE_SIZE", "10"))
+
+# /import: максимум строк в одном файле
+IMPORT_MAX_ROWS: int = int(os.getenv("IMPORT_MAX_ROWS", "5000"))
+
+# Аренда пачки outbox воркером (сек): если воркер упал, события заберёт другой
+OUTBOX_LEASE_SECONDS: int = int(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+
+# sync_worker: будится по NOTIFY; опрос — только запасной вариант (сек).
+# На SQLite NOTIFY нет — опрос основной, поэтому по умолчанию чаще.
+SYNC_POLL_INTERVAL: float = float(os.getenv("SYNC_POLL_INTERVAL", "5" if IS_SQLITE else "60"))
+# окно после пробуждения, чтобы собрать всплеск событий в одну пачку (сек)
+SYNC_DEBOUNCE_SECONDS: float = float(os.getenv("SYNC_DEBOUNCE_SECONDS", "2"))
+
+# Повторы упавших событий outbox: задержка base*2^attempts (с джиттером), не больше max;
+# после max_attempts событие уходит в dead-letter
+OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_BASE_SECONDS: float = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "30"))
+OUTBOX_RETRY_MAX_SECONDS: float = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "3600"))
+
+# Хранение обработанных событий outbox (дней); 0 — не чистить
+OUTBOX_RETENTION_DAYS: int = int(os.getenv("OUTBOX_RETENTION_DAYS", "30"))
+# 1 — старые секции не удалять, а отсоединять и оставлять как outbox_archived_YYYYMM
+OUTBOX_RETENTION_ARCHIVE: bool = os.getenv("OUTBOX_RETENTION_ARCHIVE", "0").strip() == "1"
+
+# Напоминания о сроках (бот): "скоро срок" за REMINDER_SOON_MINUTES и "просрочено" в момент срока.
+# В памяти держим только задачи со сроком в ближайшие REMINDER_WINDOW_HOURS.
+REMINDER_ENABLED: bool = os.getenv("REMINDER_ENABLED", "1").strip() == "1"
+REMINDER_SOON_MINUTES: int = int(os.getenv("REMINDER_SOON_MINUTES", "60"))
+REMINDER_WINDOW_HOURS: float = float(os.getenv("REMINDER_WINDOW_HOURS", "24"))
+# просрочки, наступившие пока бот не работал, досылаем не старше этого (мин)
+REMINDER_CATCHUP_MINUTES: int = int(os.getenv("REMINDER_CATCHUP_MINUTES", "120"))
+
+# Кеш справочника пользователей (сек). Основной сброс — по NOTIFY, TTL — страховка.
+USERS_CACHE_TTL: float = float(os.getenv("USERS_CACHE_TTL", "300"))
+
 
 
 # Алиасы для совместимости
@@ -1,9 +1,8 @@
 # archiver.py — ежемесячная архивация DONE задач
 
-from datetime import date
-from taskbot.sheets.users import users_get_map
-from taskbot.sheets.tasks import tasks_archive_done_before
-from taskbot.config import COMMON_SHEET
+from datetime import date, datetime
+from taskbot.storage.sql.tasks_repo import archive_done_before
+from taskbot.storage.sql.common_repo import archive_common_done_before
 
 
 def first_day_of_current_month_iso() -> str:
@@ -11,17 +10,19 @@ def first_day_of_current_month_iso() -> str:
     return date(today.year, today.month, 1).isoformat()
 
 
+def first_day_of_current_month() -> datetime:
+    today = date.today()
+    return datetime(today.year, today.month, 1)
+
+
 async def run_monthly_archive_once() -> int:
     """
-    Архивируем DONE задачи у всех пользователей и в COMMON_SHEET,
-    у которых due < 1 число текущего месяца.
+    Архивируем DONE задачи (личные и общие), у которых due < 1 число текущего месяца.
+    Каждая таблица — один UPDATE ... RETURNING + пакет событий в outbox.
     Возвращаем сколько всего пометили ARCHIVE.
     """
-    cutoff = first_day_of_current_month_iso()
-    users_map = await users_get_map()
-
-    total = 0
-    for sheet in list(users_map.keys()) + [COMMON_SHEET]:
-        total += await tasks_archive_done_before(sheet, cutoff)
+    cutoff = first_day_of_current_month()
 
+    total = await archive_done_before(cutoff)
+    total += await archive_common_done_before(cutoff)
     return total
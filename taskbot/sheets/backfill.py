@@ -0,0 +1,136 @@
+# taskbot/sheets/backfill.py
+# Перенос данных из старой "Sheets как БД" в SQL: python -m taskbot import_sheets
+# Все листы читаются одним values_batch_get, дальше — один пакетный load в storage/sql/backfill.py
+
+from __future__ import annotations
+
+from datetime import datetime
+
+from taskbot.config import (
+    USERS_SHEET,
+    COMMON_SHEET,
+    COMMON_PROGRESS_SHEET,
+    TASK_HEADERS,
+    COMMON_PROGRESS_HEADERS,
+    STATUS_TODO,
+)
+from taskbot.sheets.mirror_client import spreadsheet, to_thread
+from taskbot.storage.sql.backfill import BackfillData, load_backfill
+
+
+def _read_all_values() -> dict[str, list[list[str]]]:
+    """
+    {название листа: значения}. Один запрос метаданных + один values_batch_get на все листы.
+    """
+    ss = spreadsheet()
+    titles = [ws.title for ws in ss.worksheets()]
+    ranges = ["'" + t.replace("'", "''") + "'" for t in titles]
+    resp = ss.values_batch_get(ranges)
+    value_ranges = resp.get("valueRanges", [])
+    return {title: vr.get("values", []) for title, vr in zip(titles, value_ranges)}
+
+
+def _columns(header: list[str], expected: list[str]) -> dict[str, int]:
+    """
+    Индексы колонок по заголовку; если заголовка нет/другой — по порядку expected.
+    """
+    idx = {h: i for i, h in enumerate(header) if h in expected}
+    if len(idx) < len(expected):
+        return {h: i for i, h in enumerate(expected)}
+    return idx
+
+
+def _cell(row: list[str], idx: dict[str, int], name: str) -> str:
+    i = idx.get(name)
+    if i is None or i >= len(row):
+        return ""
+    return str(row[i]).strip()
+
+
+def _parse_due(value: str) -> datetime | None:
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d", "%d.%m.%Y %H:%M", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def _parse_created(value: str) -> datetime | None:
+    try:
+        dt = datetime.fromisoformat(value.rstrip("Z"))
+    except ValueError:
+        return None
+    return dt.replace(tzinfo=None)
+
+
+def _task_id(value: str) -> int | None:
+    return int(value) if value.isdigit() else None
+
+
+def _parse_task_rows(values: list[list[str]], now: datetime) -> list[dict]:
+    if not values:
+        return []
+    idx = _columns(values[0], TASK_HEADERS)
+    out = []
+    for row in values[1:]:
+        text = _cell(row, idx, "Task")
+        if not text:
+            continue
+        out.append({
+            "id": _task_id(_cell(row, idx, "TaskID")),
+            "task_text": text,
+            "from_name": _cell(row, idx, "From"),
+            "due_at": _parse_due(_cell(row, idx, "Due")),
+            "status": _cell(row, idx, "Status") or STATUS_TODO,
+            "created_at": _parse_created(_cell(row, idx, "CreatedAt")) or now,
+        })
+    return out
+
+
+def build_backfill(sheets: dict[str, list[list[str]]]) -> BackfillData:
+    """
+    Листы -> строки таблиц:
+    Users -> users, "Общие" -> common_tasks, CommonProgress -> common_progress,
+    остальные листы — личные задачи (имя листа = assignee_name).
+    """
+    now = datetime.utcnow()
+    data = BackfillData()
+
+    for row in sheets.get(USERS_SHEET, [])[1:]:
+        if len(row) >= 2 and row[0].strip() and str(row[1]).strip().isdigit():
+            data.users.append({"name": row[0].strip(), "telegram_id": int(row[1]), "created_at": now})
+
+    data.common = _parse_task_rows(sheets.get(COMMON_SHEET, []), now)
+
+    progress = sheets.get(COMMON_PROGRESS_SHEET, [])
+    if progress:
+        idx = _columns(progress[0], COMMON_PROGRESS_HEADERS)
+        for row in progress[1:]:
+            task_id = _task_id(_cell(row, idx, "TaskID"))
+            user_name = _cell(row, idx, "User")
+            if task_id is None or not user_name:
+                continue
+            data.progress.append({
+                "task_id": task_id,
+                "user_name": user_name,
+                "status": _cell(row, idx, "Status") or STATUS_TODO,
+                "updated_at": _parse_created(_cell(row, idx, "UpdatedAt")) or now,
+            })
+
+    for title, values in sheets.items():
+        if title in (USERS_SHEET, COMMON_SHEET, COMMON_PROGRESS_SHEET):
+            continue
+        for t in _parse_task_rows(values, now):
+            data.tasks.append({"assignee_name": title, **t})
+
+    return data
+
+
+async def import_sheets(replace: bool = False) -> dict[str, int]:
+    """
+    Читаем всю таблицу и загружаем в SQL одной транзакцией.
+    Возвращаем счётчики по таблицам (см. load_backfill).
+    """
+    sheets = await to_thread(_read_all_values)
+    return await load_backfill(build_backfill(sheets), replace=replace)
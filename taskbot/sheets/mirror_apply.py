@@ -4,10 +4,11 @@
 
 from __future__ import annotations
 
-import json
 import gspread
+from gspread.utils import rowcol_to_a1
 
 from taskbot.sheets.mirror_client import spreadsheet, to_thread
+from taskbot.utils import jsoncodec
 from taskbot.sheets.mirror_schema import ensure_base_structure
 from taskbot.config import USERS_SHEET, COMMON_SHEET, TASK_HEADERS, USERS_HEADERS, COMMON_PROGRESS_SHEET
 
@@ -32,6 +33,16 @@ def _update_cell_by_header(ws: gspread.Worksheet, row: int, header: str, value:
     ws.update_cell(row, col, value)
 
 
+def _update_cells_by_header(ws: gspread.Worksheet, row: int, values: dict[str, str]) -> None:
+    """
+    Несколько ячеек строки одним запросом (batch_update).
+    """
+    ws.batch_update(
+        [{"range": rowcol_to_a1(row, TASK_HEADERS.index(h) + 1), "values": [[v]]} for h, v in values.items()],
+        value_input_option="RAW",
+    )
+
+
 def _append_task_row(ws: gspread.Worksheet, payload: dict) -> None:
     ws.append_row(
         [str(payload["task_id"]), payload["task"], payload["from_name"], payload.get("due", ""), payload["status"], ""],
@@ -59,9 +70,10 @@ def _delete_user_from_users_sheet(name: str) -> None:
             return
 
 
-async def apply_events(events: list[tuple[int, str, str]]) -> None:
+async def apply_events(events: list[tuple[int, str, str | dict]]) -> None:
     """
-    events: [(outbox_id, event_type, payload_json), ...]
+    events: [(outbox_id, event_type, payload | payload_json), ...]
+    payload может прийти уже разобранным (после схлопывания в mirror_coalesce).
     """
     # Сначала убедимся, что структура есть.
     # В идеале сюда надо передать список пользователей из SQL (мы сделаем это в worker)
@@ -69,7 +81,7 @@ async def apply_events(events: list[tuple[int, str, str]]) -> None:
     ss = spreadsheet()
 
     for outbox_id, etype, payload_json in events:
-        payload = json.loads(payload_json)
+        payload = jsoncodec.loads(payload_json) if isinstance(payload_json, (str, bytes)) else payload_json
 
         if etype == "USER_UPSERT":
             await to_thread(_upsert_user_in_users_sheet, payload["name"], int(payload["telegram_id"]))
@@ -99,6 +111,13 @@ async def apply_events(events: list[tuple[int, str, str]]) -> None:
             if row:
                 await to_thread(_update_cell_by_header, ws, row, "Due", payload["due"])
 
+        elif etype == "TASK_PATCH":
+            # схлопнутые изменения нескольких полей: один find + один batch_update
+            ws = await to_thread(ss.worksheet, payload["sheet"])
+            row = await to_thread(_find_row_by_task_id, ws, payload["task_id"])
+            if row:
+                await to_thread(_update_cells_by_header, ws, row, payload["fields"])
+
         elif etype == "TASK_DELETE":
             ws = await to_thread(ss.worksheet, payload["sheet"])
             row = await to_thread(_find_row_by_task_id, ws, payload["task_id"])
@@ -109,15 +128,20 @@ async def apply_events(events: list[tuple[int, str, str]]) -> None:
             ws = await to_thread(ss.worksheet, COMMON_SHEET)
             await to_thread(_append_task_row, ws, {"sheet": COMMON_SHEET, **payload})
 
+        elif etype == "COMMON_STATUS":
+            ws = await to_thread(ss.worksheet, COMMON_SHEET)
+            row = await to_thread(_find_row_by_task_id, ws, payload["task_id"])
+            if row:
+                await to_thread(_update_cell_by_header, ws, row, "Status", payload["status"])
+
         elif etype == "COMMON_PROGRESS":
             # progress пишем в отдельный лист как лог (TaskID, User, Status, UpdatedAt)
             ws = await to_thread(ss.worksheet, COMMON_PROGRESS_SHEET)
             await to_thread(ws.append_row, [str(payload["task_id"]), payload["user"], payload["status"], ""], "RAW")
 
         elif etype == "TASK_ARCHIVE_BATCH":
-            # Для простоты: ничего не делаем батчем.
-            # ARCHIVE уже прилетит как TASK_STATUS от конкретных задач при изменении.
-            # (или можно реализовать отдельный проход по листам — по желанию)
+            # Устаревшее событие (старые строки outbox): архив теперь приходит
+            # как TASK_STATUS / COMMON_STATUS по каждой задаче.
             pass
 
         else:
@@ -0,0 +1,126 @@
+# taskbot/sheets/mirror_coalesce.py
+# Схлопывание пачки событий outbox перед применением в Google Sheets.
+#
+# Одна задача часто даёт CREATED -> STATUS -> TEXT -> DUE за минуту, или создаётся и сразу удаляется.
+# Каждое событие по отдельности = ws.find + update_cell, поэтому сворачиваем цепочку по задаче
+# в итоговый эффект:
+#   CREATED + изменения  -> один CREATED с финальными значениями (одна вставка строки);
+#   CREATED + DELETE     -> ничего;
+#   только изменения     -> одно событие (последнее значение каждого поля),
+#                           несколько полей -> TASK_PATCH (один find + один batch_update);
+#   изменения + DELETE   -> только DELETE.
+# Все исходные outbox id сохраняются, чтобы воркер отметил их обработанными.
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any
+
+from taskbot.utils import jsoncodec
+
+# событие -> (поле payload, заголовок колонки в листе)
+_TASK_FIELD_EVENTS = {
+    "TASK_STATUS": ("status", "Status"),
+    "TASK_TEXT": ("task", "Task"),
+    "TASK_DUE": ("due", "Due"),
+}
+
+
+@dataclass
+class MirrorOp:
+    """
+    Итоговое действие над зеркалом + все outbox id, которые оно покрывает.
+    """
+    event_type: str
+    payload: dict
+    source_ids: list[int]
+
+
+@dataclass
+class _TaskChain:
+    kind: str                      # "task" (личная) или "common"
+    created: dict | None = None    # payload CREATED с накопленными изменениями
+    deleted: bool = False
+    fields: dict[str, tuple[str, Any]] = field(default_factory=dict)  # header -> (event_type, value)
+    ids: list[int] = field(default_factory=list)
+
+
+def _payload(raw: Any) -> dict:
+    return jsoncodec.loads(raw) if isinstance(raw, (str, bytes)) else dict(raw)
+
+
+def coalesce_events(events: list[tuple[int, str, Any]]) -> tuple[list[MirrorOp], list[int]]:
+    """
+    events: [(outbox_id, event_type, payload), ...] по возрастанию id.
+    Возвращаем (ops, noop_ids): ops — что применить (в порядке первого появления),
+    noop_ids — события, которые схлопнулись в "ничего" (их сразу можно отметить обработанными).
+    """
+    # ключ -> цепочка задачи или одиночное событие (порядок вставки = порядок применения)
+    slots: dict[Any, _TaskChain | MirrorOp] = {}
+
+    for outbox_id, etype, raw in events:
+        payload = _payload(raw)
+
+        if etype == "TASK_CREATED" or etype in _TASK_FIELD_EVENTS or etype == "TASK_DELETE":
+            key = ("task", payload["sheet"], int(payload["task_id"]))
+            chain = slots.setdefault(key, _TaskChain(kind="task"))
+        elif etype in ("COMMON_CREATED", "COMMON_STATUS"):
+            key = ("common", int(payload["task_id"]))
+            chain = slots.setdefault(key, _TaskChain(kind="common"))
+        else:
+            # USER_*, COMMON_PROGRESS и прочее — как есть
+            slots[("single", outbox_id)] = MirrorOp(etype, payload, [outbox_id])
+            continue
+
+        chain.ids.append(outbox_id)
+        if chain.deleted:
+            # задачи уже нет — всё, что после удаления, не имеет эффекта
+            continue
+
+        if etype in ("TASK_CREATED", "COMMON_CREATED"):
+            chain.created = payload
+            chain.fields.clear()
+        elif etype == "TASK_DELETE":
+            chain.deleted = True
+            chain.fields.clear()
+        else:
+            if etype == "COMMON_STATUS":
+                key_name, header = "status", "Status"
+            else:
+                key_name, header = _TASK_FIELD_EVENTS[etype]
+            if chain.created is not None:
+                chain.created[key_name] = payload[key_name]
+            else:
+                chain.fields[header] = (etype, payload)
+
+    ops: list[MirrorOp] = []
+    noop_ids: list[int] = []
+
+    for key, slot in slots.items():
+        if isinstance(slot, MirrorOp):
+            ops.append(slot)
+            continue
+
+        chain = slot
+        if chain.created is not None and chain.deleted:
+            # создали и удалили в одной пачке — в лист не попадает
+            noop_ids.extend(chain.ids)
+        elif chain.created is not None:
+            etype = "TASK_CREATED" if chain.kind == "task" else "COMMON_CREATED"
+            ops.append(MirrorOp(etype, chain.created, chain.ids))
+        elif chain.deleted:
+            ops.append(MirrorOp("TASK_DELETE", {"sheet": key[1], "task_id": key[2]}, chain.ids))
+        elif len(chain.fields) == 1:
+            # одно изменённое поле — последнее событие этого поля как есть
+            (etype, payload), = chain.fields.values()
+            ops.append(MirrorOp(etype, payload, chain.ids))
+        elif chain.fields:
+            values = {}
+            for header, (etype, payload) in chain.fields.items():
+                key_name = _TASK_FIELD_EVENTS[etype][0]
+                values[header] = payload[key_name]
+            ops.append(MirrorOp("TASK_PATCH", {"sheet": key[1], "task_id": key[2], "fields": values}, chain.ids))
+        else:
+            noop_ids.extend(chain.ids)
+
+    return ops, noop_ids
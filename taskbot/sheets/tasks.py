@@ -4,20 +4,12 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import List
+from typing import List, Dict, Tuple, Optional
 
-from taskbot.config import STATUS_TODO, STATUS_DONE
-from taskbot.storage.sql import tasks_repo
-
-
-@dataclass
-class TaskRow:
-    task_id: str
-    task: str
-    from_name: str
-    due_str: str
-    status: str
-    created_at: str
+from taskbot.config import STATUS_TODO, STATUS_DONE, COMMON_SHEET
+from taskbot.storage.sql import tasks_repo, search_repo
+from taskbot.storage.sql.rows import TaskRow  # репозиторий отдаёт TaskRow напрямую
+from taskbot.storage.sql.counters import TaskCounters
 
 
 def now_iso() -> str:
@@ -27,12 +19,13 @@ def now_iso() -> str:
     return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
 
-async def task_append(sheet_name: str, row: TaskRow) -> str:
+async def task_append(user_id: Optional[int], sheet_name: str, row: TaskRow) -> str:
     """
-    Создаём задачу в SQL.
+    Создаём задачу в SQL: владелец user_id (None — лист "Общие"), sheet_name — вкладка в Google.
     Возвращаем task_id (порядковый номер).
     """
     task_id = await tasks_repo.task_create(
+        user_id=user_id,
         assignee_name=sheet_name,
         task_text=row.task,
         from_name=row.from_name,
@@ -43,30 +36,119 @@ async def task_append(sheet_name: str, row: TaskRow) -> str:
     return str(task_id)
 
 
-async def tasks_list(sheet_name: str) -> List[TaskRow]:
-    rows = await tasks_repo.tasks_list(sheet_name)
-    return [TaskRow(**r) for r in rows]
+async def tasks_import(items: List[Tuple[str, str, str, str]]) -> int:
+    """
+    Массовое создание задач: [(лист, текст, от кого, срок), ...] -> сколько создано.
+    """
+    return await tasks_repo.tasks_import(items)
+
+
+async def tasks_list(user_id: Optional[int], mode: str = "all", sheet: str = COMMON_SHEET) -> List[TaskRow]:
+    """
+    mode: my/overdue/done/all (фильтр и сортировка по сроку делаются в SQL).
+    """
+    return await tasks_repo.tasks_list(user_id, mode, sheet)
+
+
+@dataclass
+class TaskPage:
+    """
+    Страница списка задач: [(TaskRow, is_common)] + курсоры для кнопок "назад/вперёд".
+    """
+    items: List[Tuple[TaskRow, bool]]
+    has_prev: bool
+    has_next: bool
+    first_cursor: Optional[str]
+    last_cursor: Optional[str]
+
+
+def _to_task_page(page) -> TaskPage:
+    return TaskPage(page.rows, page.has_prev, page.has_next, page.first_cursor, page.last_cursor)
+
+
+async def tasks_page_for_user(user_id: int, mode: str, cursor: Optional[str] = None, direction: str = "n") -> TaskPage:
+    """
+    Страница "личные + общие" для пользователя (keyset-пагинация в SQL).
+    """
+    return _to_task_page(await tasks_repo.tasks_page_for_user(user_id, mode, cursor, direction))
+
+
+async def tasks_page(
+    user_id: Optional[int],
+    mode: str,
+    cursor: Optional[str] = None,
+    direction: str = "n",
+    sheet: str = COMMON_SHEET,
+) -> TaskPage:
+    """
+    Страница личных задач пользователя (для админ-просмотра);
+    None — задачи вкладки sheet без пользователя ("Общие" или незарегистрированный лист).
+    """
+    return _to_task_page(await tasks_repo.tasks_page(user_id, mode, cursor, direction, sheet=sheet))
+
+
+async def tasks_unowned_sheets() -> List[str]:
+    """
+    Вкладки с задачами без зарегистрированного пользователя (кроме "Общие").
+    """
+    return await tasks_repo.tasks_unowned_sheets()
+
+
+@dataclass
+class SearchPage:
+    """
+    Страница результатов поиска: [(TaskRow, is_common, владелец)], листание по offset.
+    """
+    items: List[Tuple[TaskRow, bool, str]]
+    has_prev: bool
+    has_next: bool
+
+
+async def search_tasks(query: str, user_id: Optional[int] = None, offset: int = 0) -> SearchPage:
+    """
+    Полнотекстовый поиск: user_id задан — личные + общие пользователя, None — по всем (админ).
+    """
+    page = await search_repo.search_tasks(query, user_id, offset)
+    return SearchPage(page.rows, page.has_prev, page.has_next)
+
+
+async def team_overdue() -> Dict[str, List[Tuple[TaskRow, bool]]]:
+    """
+    Просроченные задачи всей команды: {имя: [(TaskRow, is_common), ...]}.
+    Считается одним запросом в SQL.
+    """
+    return await tasks_repo.team_overdue()
+
+
+async def task_counters(user_id: int) -> TaskCounters:
+    """
+    Открытые / просроченные / выполненные (личные + общие) — без загрузки списка задач.
+    """
+    return await tasks_repo.task_counters(user_id)
+
 
+# user_id — владелец задачи (None — вкладка sheet без пользователя, по умолчанию "Общие"):
+# чужую задачу по id не тронуть
 
-async def task_set_done(sheet_name: str, task_id: str) -> bool:
-    return await tasks_repo.task_set_status(sheet_name, task_id, STATUS_DONE)
+async def task_set_done(user_id: Optional[int], task_id: str) -> bool:
+    return await tasks_repo.task_set_status(user_id, task_id, STATUS_DONE)
 
 
-async def task_set_todo(sheet_name: str, task_id: str) -> bool:
-    return await tasks_repo.task_set_status(sheet_name, task_id, STATUS_TODO)
+async def task_set_todo(user_id: Optional[int], task_id: str) -> bool:
+    return await tasks_repo.task_set_status(user_id, task_id, STATUS_TODO)
 
 
-async def task_set_status(sheet_name: str, task_id: str, status: str) -> bool:
-    return await tasks_repo.task_set_status(sheet_name, task_id, status)
+async def task_set_status(user_id: Optional[int], task_id: str, status: str, sheet: str = COMMON_SHEET) -> bool:
+    return await tasks_repo.task_set_status(user_id, task_id, status, sheet)
 
 
-async def task_update_text(sheet_name: str, task_id: str, new_text: str) -> bool:
-    return await tasks_repo.task_update_text(sheet_name, task_id, new_text)
+async def task_update_text(user_id: Optional[int], task_id: str, new_text: str, sheet: str = COMMON_SHEET) -> bool:
+    return await tasks_repo.task_update_text(user_id, task_id, new_text, sheet)
 
 
-async def task_update_due(sheet_name: str, task_id: str, due_str: str) -> bool:
-    return await tasks_repo.task_update_due(sheet_name, task_id, due_str)
+async def task_update_due(user_id: Optional[int], task_id: str, due_str: str, sheet: str = COMMON_SHEET) -> bool:
+    return await tasks_repo.task_update_due(user_id, task_id, due_str, sheet)
 
 
-async def task_delete(sheet_name: str, task_id: str) -> bool:
-    return await tasks_repo.task_delete(sheet_name, task_id)
+async def task_delete(user_id: Optional[int], task_id: str, sheet: str = COMMON_SHEET) -> bool:
+    return await tasks_repo.task_delete(user_id, task_id, sheet)
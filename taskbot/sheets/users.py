@@ -4,6 +4,7 @@
 from __future__ import annotations
 from taskbot.storage.sql.users_repo import (
     users_get_map,
+    users_id_map,
     users_list,
     users_upsert,
     users_get_by_telegram_id,
@@ -14,6 +15,7 @@ from taskbot.storage.sql.users_repo import (
 
 __all__ = [
     "users_get_map",
+    "users_id_map",
     "users_list",
     "users_upsert",
     "users_get_by_telegram_id",
@@ -0,0 +1,129 @@
+# taskbot/storage/sql/backfill.py
+# Пакетная загрузка данных из старой Google-таблицы (см. sheets/backfill.py)
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from sqlalchemy import select, insert, delete, func, text
+
+from taskbot.config import IS_SQLITE
+from taskbot.storage.sql.db import unit_of_work, upsert_insert
+from taskbot.storage.sql.models import User, Task, CommonTask, CommonProgress
+from taskbot.storage.sql.notify import notify
+from taskbot.storage.sql.users_directory import USERS_CHANNEL
+from taskbot.storage.sql.tasks_repo import rebuild_counters
+from taskbot.storage.sql.users_repo import link_user_tasks
+
+_TASK_COLUMNS = ["id", "assignee_name", "task_text", "from_name", "due_at", "status", "created_at"]
+_COMMON_COLUMNS = ["id", "task_text", "from_name", "due_at", "status", "created_at"]
+_PROGRESS_COLUMNS = ["task_id", "user_name", "status", "updated_at"]
+
+
+@dataclass
+class BackfillData:
+    users: list[dict] = field(default_factory=list)
+    tasks: list[dict] = field(default_factory=list)     # id может быть None — назначим сами
+    common: list[dict] = field(default_factory=list)
+    progress: list[dict] = field(default_factory=list)
+
+
+def _assign_ids(rows: list[dict]) -> tuple[list[dict], int]:
+    """
+    Сохраняем исходные TaskID; строкам без id или с повторным id (в старой таблице
+    номера могли повторяться между листами) выдаём новые после максимального.
+    Возвращаем (строки, сколько получили новый id).
+    """
+    seen: set[int] = set()
+    pending: list[dict] = []
+    for r in rows:
+        if r["id"] is None or r["id"] in seen:
+            pending.append(r)
+        else:
+            seen.add(r["id"])
+    next_id = max(seen, default=0) + 1
+    for r in pending:
+        r["id"] = next_id
+        next_id += 1
+    return rows, len(pending)
+
+
+async def _copy(pg, table: str, columns: list[str], rows: list[dict]) -> None:
+    if rows:
+        await pg.copy_records_to_table(table, columns=columns, records=[tuple(r[c] for c in columns) for r in rows])
+
+
+async def _bulk_load(session, tasks: list[dict], common: list[dict], progress: list[dict]) -> None:
+    """
+    Postgres: COPY + setval последовательностей.
+    SQLite: executemany INSERT (COPY нет; id = max(rowid)+1 и так, последовательности не нужны).
+    """
+    if IS_SQLITE:
+        for model, rows in ((Task, tasks), (CommonTask, common), (CommonProgress, progress)):
+            if rows:
+                await session.execute(insert(model), rows)
+        return
+
+    conn = await session.connection()
+    pg = (await conn.get_raw_connection()).driver_connection
+    await _copy(pg, Task.__tablename__, _TASK_COLUMNS, tasks)
+    await _copy(pg, CommonTask.__tablename__, _COMMON_COLUMNS, common)
+    await _copy(pg, CommonProgress.__tablename__, _PROGRESS_COLUMNS, progress)
+
+    for table in (Task.__tablename__, CommonTask.__tablename__, CommonProgress.__tablename__):
+        await session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE((SELECT max(id) FROM {table}), 0) + 1, false)"
+        ))
+
+
+async def load_backfill(data: BackfillData, replace: bool = False) -> dict[str, int]:
+    """
+    Одна транзакция: users (upsert по имени), затем COPY в tasks/common_tasks/common_progress
+    с исходными id и setval последовательностей.
+    Событий outbox не пишем — эти данные уже лежат в таблице.
+    Если в tasks/common_tasks уже есть строки — отказываемся (replace=True сначала очищает их).
+    """
+    tasks, tasks_renumbered = _assign_ids(data.tasks)
+
+    # общие задачи с повторным id пропускаем: на их номер ссылается прогресс
+    common: list[dict] = []
+    common_ids: set[int] = set()
+    for r in data.common:
+        if r["id"] is not None and r["id"] not in common_ids:
+            common_ids.add(r["id"])
+            common.append(r)
+
+    # прогресс: только по существующим общим задачам, последняя строка по (task_id, user) побеждает
+    progress = list({
+        (r["task_id"], r["user_name"]): r for r in data.progress if r["task_id"] in common_ids
+    }.values())
+
+    async with unit_of_work() as session:
+        if replace and IS_SQLITE:
+            for model in (CommonProgress, CommonTask, Task):
+                await session.execute(delete(model))
+        elif replace:
+            await session.execute(text("TRUNCATE tasks, common_progress, common_tasks RESTART IDENTITY"))
+        else:
+            has_tasks = (await session.execute(select(func.count()).select_from(Task))).scalar_one()
+            has_common = (await session.execute(select(func.count()).select_from(CommonTask))).scalar_one()
+            if has_tasks or has_common:
+                raise RuntimeError("tasks/common_tasks are not empty; rerun with --replace to overwrite")
+
+        if data.users:
+            await session.execute(upsert_insert(User).values(data.users).on_conflict_do_nothing())
+            await notify(session, USERS_CHANNEL)  # работающие боты перечитают справочник
+
+        await _bulk_load(session, tasks, common, progress)
+        await link_user_tasks(session)  # COPY пишет имена вкладок — владельцев проставляем одним UPDATE
+        await rebuild_counters(session)
+
+    return {
+        "users": len(data.users),
+        "tasks": len(tasks),
+        "tasks_renumbered": tasks_renumbered,
+        "common": len(common),
+        "common_skipped": len(data.common) - len(common),
+        "progress": len(progress),
+    }
@@ -4,114 +4,118 @@
 from __future__ import annotations
 
 from datetime import datetime
-from sqlalchemy import select
-from taskbot.config import STATUS_TODO, STATUS_DONE, STATUS_ARCHIVE
-from taskbot.storage.sql.db import SessionLocal
+from sqlalchemy import select, update, case, and_
+from taskbot.config import STATUS_DONE, STATUS_ARCHIVE
+from taskbot.storage.sql.db import read_session, unit_of_work, db_now, upsert_insert
 from taskbot.storage.sql.models import CommonTask, CommonProgress
-from taskbot.storage.sql.outbox import outbox_add
-
-
-def _parse_due_str(due_str: str | None) -> datetime | None:
-    if not due_str:
-        return None
-    due_str = due_str.strip()
-    try:
-        if " " in due_str:
-            return datetime.strptime(due_str, "%Y-%m-%d %H:%M")
-        return datetime.strptime(due_str, "%Y-%m-%d")
-    except Exception:
-        return None
-
-
-def _due_to_str(due_at: datetime | None) -> str:
-    if not due_at:
-        return ""
-    return due_at.strftime("%Y-%m-%d %H:%M")
-
-
-async def common_task_create(task_text: str, from_name: str, due_str: str, status: str) -> int:
-    due_at = _parse_due_str(due_str)
-    async with SessionLocal() as session:
-        t = CommonTask(
-            task_text=task_text,
-            from_name=from_name,
-            due_at=due_at,
-            status=status or STATUS_TODO,
-            created_at=datetime.utcnow(),
-        )
-        session.add(t)
-        await session.commit()
-        await session.refresh(t)
-        tid = int(t.id)
-
-    await outbox_add("COMMON_CREATED", {
-        "task_id": tid,
-        "task": task_text,
-        "from_name": from_name,
-        "due": _due_to_str(due_at),
-        "status": status or STATUS_TODO,
-    })
-    return tid
-
-
-async def common_tasks_list() -> list[dict]:
-    async with SessionLocal() as session:
-        res = await session.execute(select(CommonTask).order_by(CommonTask.id.desc()))
-        rows = res.scalars().all()
-
-    out = []
-    for t in rows:
-        out.append({
-            "task_id": str(t.id),
-            "task": t.task_text,
-            "from_name": t.from_name,
-            "due_str": _due_to_str(t.due_at),
-            "status": t.status,
-            "created_at": t.created_at.isoformat() + "Z",
-        })
-    return out
-
-
-async def common_progress_set_done(task_id: str, user_name: str) -> None:
+from taskbot.storage.sql.outbox import outbox_add, outbox_add_many
+from taskbot.storage.sql.rows import TaskRow, task_row
+from taskbot.storage.sql.counters import COMMON_COUNTER_KEY, CounterDelta
+
+
+def common_for_user_query(user_id: int, mode: str):
     """
-    Отмечаем общую задачу DONE для конкретного пользователя.
+    SELECT общих задач со статусом "для пользователя":
+    common_tasks LEFT JOIN common_progress ON task_id AND user_id.
+    ARCHIVE и фильтры режима (my/done/overdue) применяются в SQL.
+    Используется и отдельно, и как часть постраничного списка в tasks_repo.
     """
-    tid = int(task_id)
-    async with SessionLocal() as session:
-        res = await session.execute(
-            select(CommonProgress).where(CommonProgress.task_id == tid, CommonProgress.user_name == user_name)
+    # DONE по прогрессу пользователя перекрывает статус самой задачи
+    status_for_user = case((CommonProgress.status == STATUS_DONE, STATUS_DONE), else_=CommonTask.status)
+
+    q = (
+        select(
+            CommonTask.id,
+            CommonTask.task_text,
+            CommonTask.from_name,
+            CommonTask.due_at,
+            status_for_user.label("status"),
+            CommonTask.created_at,
         )
-        p = res.scalar_one_or_none()
-        if p:
-            p.status = STATUS_DONE
-            p.updated_at = datetime.utcnow()
-        else:
-            session.add(CommonProgress(task_id=tid, user_name=user_name, status=STATUS_DONE, updated_at=datetime.utcnow()))
-        await session.commit()
+        .select_from(CommonTask)
+        .outerjoin(
+            CommonProgress,
+            and_(CommonProgress.task_id == CommonTask.id, CommonProgress.user_id == user_id),
+        )
+        .where(status_for_user != STATUS_ARCHIVE)
+    )
 
-    await outbox_add("COMMON_PROGRESS", {"task_id": tid, "user": user_name, "status": STATUS_DONE})
+    if mode == "my":
+        q = q.where(status_for_user != STATUS_DONE)
+    elif mode == "done":
+        q = q.where(status_for_user == STATUS_DONE)
+    elif mode == "overdue":
+        q = q.where(status_for_user != STATUS_DONE, CommonTask.due_at.is_not(None), CommonTask.due_at < db_now())
+    return q
 
 
-async def common_progress_is_done(task_id: int, user_name: str) -> bool:
-    async with SessionLocal() as session:
-        res = await session.execute(
-            select(CommonProgress).where(CommonProgress.task_id == task_id, CommonProgress.user_name == user_name)
-        )
-        p = res.scalar_one_or_none()
-        return bool(p and p.status == STATUS_DONE)
+async def common_tasks_for_user(user_id: int, mode: str) -> list[TaskRow]:
+    """
+    Общие задачи для пользователя одним запросом (см. common_for_user_query).
+    """
+    q = common_for_user_query(user_id, mode).order_by(CommonTask.id.desc())
+
+    async with read_session() as session:
+        res = await session.execute(q)
+        return [task_row(r) for r in res]
+
+
+async def common_progress_set_done(task_id: str, user_id: int, user_name: str) -> None:
+    """
+    Отмечаем общую задачу DONE для конкретного пользователя.
+    user_name — только для лога в Google (текущее имя).
+    Один UPSERT ... ON CONFLICT DO UPDATE WHERE status != DONE RETURNING: строка возвращается,
+    только если отметка действительно появилась (двойное нажатие / второй экземпляр бота
+    не даст IntegrityError и не сдвинет счётчик дважды).
+    """
+    tid = int(task_id)
+    now = datetime.utcnow()
+    ins = upsert_insert(CommonProgress).values(
+        task_id=tid, user_id=user_id, user_name=user_name, status=STATUS_DONE, updated_at=now,
+    )
+    stmt = ins.on_conflict_do_update(
+        index_elements=[CommonProgress.task_id, CommonProgress.user_id],
+        set_={"status": STATUS_DONE, "user_name": ins.excluded.user_name, "updated_at": ins.excluded.updated_at},
+        where=CommonProgress.status != STATUS_DONE,
+    ).returning(CommonProgress.id)
+
+    async with unit_of_work() as session:
+        if (await session.execute(stmt)).first() is None:
+            return  # уже DONE — ничего не изменилось
+
+        # счётчик: открытая общая задача стала закрытой для этого пользователя
+        task_status = (await session.execute(select(CommonTask.status).where(CommonTask.id == tid))).scalar_one_or_none()
+        if task_status not in (None, STATUS_DONE, STATUS_ARCHIVE):
+            delta = CounterDelta()
+            delta.add(user_id, common_done=1)
+            await delta.apply(session)
+
+        await outbox_add("COMMON_PROGRESS", {"task_id": tid, "user": user_name, "status": STATUS_DONE}, session=session)
 
 
 async def archive_common_done_before(cutoff: datetime) -> int:
-    async with SessionLocal() as session:
+    """
+    DONE общие задачи с due_at < cutoff -> ARCHIVE одним UPDATE ... RETURNING,
+    плюс пакет событий COMMON_STATUS для зеркала.
+    """
+    async with unit_of_work() as session:
         res = await session.execute(
-            select(CommonTask).where(CommonTask.status == STATUS_DONE, CommonTask.due_at.is_not(None), CommonTask.due_at < cutoff)
+            update(CommonTask)
+            .where(CommonTask.status == STATUS_DONE, CommonTask.due_at.is_not(None), CommonTask.due_at < cutoff)
+            .values(status=STATUS_ARCHIVE)
+            .returning(CommonTask.id)
+            .execution_options(synchronize_session=False)
         )
-        rows = res.scalars().all()
-        if not rows:
+        ids = res.scalars().all()
+        if not ids:
             return 0
-        for t in rows:
-            t.status = STATUS_ARCHIVE
-        await session.commit()
 
-    await outbox_add("TASK_ARCHIVE_BATCH", {"cutoff": cutoff.isoformat(), "type": "common"})
-    return len(rows)
+        delta = CounterDelta()
+        delta.move(COMMON_COUNTER_KEY, STATUS_DONE, STATUS_ARCHIVE, n=len(ids))
+        await delta.apply(session)
+
+        await outbox_add_many([
+            ("COMMON_STATUS", {"task_id": int(tid), "status": STATUS_ARCHIVE})
+            for tid in ids
+        ], session=session)
+    return len(ids)
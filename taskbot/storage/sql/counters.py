@@ -0,0 +1,94 @@
+# taskbot/storage/sql/counters.py
+# Инкрементальные счётчики задач (user_task_counters): дельты пишутся в транзакции мутации
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from taskbot.config import STATUS_DONE, STATUS_ARCHIVE
+from taskbot.storage.sql.db import upsert_insert
+from taskbot.storage.sql.models import UserTaskCounter
+
+# строка счётчиков самих общих задач (users.id начинается с 1)
+COMMON_COUNTER_KEY = 0
+
+
+@dataclass
+class TaskCounters:
+    open: int = 0
+    overdue: int = 0
+    done: int = 0
+
+
+def status_bucket(status: str | None) -> str | None:
+    """
+    В какой счётчик попадает задача с таким статусом: "open", "done" или никуда (ARCHIVE/удалена).
+    """
+    if status is None or status == STATUS_ARCHIVE:
+        return None
+    if status == STATUS_DONE:
+        return "done"
+    return "open"
+
+
+class CounterDelta:
+    """
+    Накопитель дельт {user_id: [open, done, common_done]} — чтобы пачка изменений
+    ушла одним UPSERT (executemany), а не по запросу на задачу.
+    Задачи без пользователя (user_id None — лист "Общие", незарегистрированные листы) не считаем.
+    """
+
+    def __init__(self) -> None:
+        self._d: dict[int, list[int]] = {}
+
+    def add(self, user_id: int | None, open_: int = 0, done: int = 0, common_done: int = 0) -> None:
+        if user_id is None:
+            return
+        d = self._d.setdefault(user_id, [0, 0, 0])
+        d[0] += open_
+        d[1] += done
+        d[2] += common_done
+
+    def move(self, user_id: int | None, old_status: str | None, new_status: str | None, n: int = 1) -> None:
+        """
+        Задача перешла из old_status в new_status (None — не было / больше нет).
+        """
+        for bucket, sign in ((status_bucket(old_status), -n), (status_bucket(new_status), n)):
+            if bucket == "open":
+                self.add(user_id, open_=sign)
+            elif bucket == "done":
+                self.add(user_id, done=sign)
+
+    async def apply(self, session: AsyncSession) -> None:
+        rows = [
+            {"user_id": uid, "open_count": o, "done_count": d, "common_done_count": c}
+            for uid, (o, d, c) in self._d.items()
+            if o or d or c
+        ]
+        if not rows:
+            return
+        ins = upsert_insert(UserTaskCounter)
+        t = UserTaskCounter.__table__
+        await session.execute(
+            ins.on_conflict_do_update(
+                index_elements=[t.c.user_id],
+                set_={
+                    "open_count": t.c.open_count + ins.excluded.open_count,
+                    "done_count": t.c.done_count + ins.excluded.done_count,
+                    "common_done_count": t.c.common_done_count + ins.excluded.common_done_count,
+                },
+            ),
+            rows,
+        )
+        self._d.clear()
+
+
+async def bump(session: AsyncSession, user_id: int | None, old_status: str | None, new_status: str | None) -> None:
+    """
+    Одна задача сменила статус — короткая форма для одиночных мутаций.
+    """
+    delta = CounterDelta()
+    delta.move(user_id, old_status, new_status)
+    await delta.apply(session)
@@ -1,17 +1,302 @@
 # taskbot/storage/sql/db.py
-# Подключение к PostgreSQL (async SQLAlchemy)
+# Подключение к PostgreSQL или встроенному SQLite (async SQLAlchemy)
 
 from __future__ import annotations
 
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from taskbot.config import DATABASE_URL
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator
+from uuid import uuid4
 
-# Создаём engine один раз на процесс
-engine = create_async_engine(
+from sqlalchemy import event, func, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from taskbot.config import (
     DATABASE_URL,
-    echo=False,          # можно True для дебага SQL
-    pool_pre_ping=True,  # проверка соединения
+    IS_SQLITE,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB,
+    DATABASE_READ_URL,
+    READ_YOUR_WRITES_SECONDS,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+    DB_LIVENESS_INTERVAL,
+    DB_POOL_LOG_STATS,
+    DB_STATEMENT_CACHE_SIZE,
+    DB_PGBOUNCER,
 )
+from taskbot.storage.sql.pool import MeteredPool
+from taskbot.utils import jsoncodec
+
+
+def _connect_args() -> dict:
+    """
+    Параметры asyncpg.
+    За PgBouncer (transaction mode) соединение с сервером меняется между транзакциями,
+    поэтому prepared statements не кешируем и даём им уникальные имена.
+    """
+    if IS_SQLITE:
+        return {}
+    if DB_PGBOUNCER:
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+    }
+
+
+def _make_engine(url: str):
+    return create_async_engine(
+        url,
+        echo=False,          # можно True для дебага SQL
+        poolclass=MeteredPool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,  # по умолчанию выключен: живость проверяет pool_liveness_loop
+        connect_args=_connect_args(),
+        # JSON/JSONB колонки (outbox.payload) кодируются быстрым кодеком с обеих сторон
+        json_serializer=jsoncodec.dumps,
+        json_deserializer=jsoncodec.loads,
+    )
+
+
+def _sqlite_pragmas(dbapi_conn, _record) -> None:
+    """
+    WAL: читатели не блокируют писателя и наоборот; synchronous=NORMAL в WAL безопасен
+    при падении процесса и заметно быстрее FULL.
+    """
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA foreign_keys=ON")
+    cur.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+    cur.execute(f"PRAGMA cache_size=-{int(SQLITE_CACHE_SIZE_KB)}")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.close()
+
+
+# Создаём engine один раз на процесс
+engine = _make_engine(DATABASE_URL)
+if IS_SQLITE:
+    event.listen(engine.sync_engine, "connect", _sqlite_pragmas)
 
-# Фабрика сессий
+# Реплика для чтения списков/отчётов (если задан DATABASE_READ_URL; у SQLite реплик нет)
+read_engine = _make_engine(DATABASE_READ_URL) if DATABASE_READ_URL and not IS_SQLITE else None
+
+# SQLite допускает одного писателя: транзакции записи процесса идут по очереди,
+# а не падают с "database is locked" (между процессами ждём busy_timeout)
+_write_lock = asyncio.Lock() if IS_SQLITE else None
+
+# Фабрики сессий
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+ReadSessionLocal = (
+    async_sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession)
+    if read_engine is not None
+    else SessionLocal
+)
+
+# Кто выполняет текущий запрос (telegram id) — ставит IdentityMiddleware.
+# Нужен для read-your-writes: после своей записи пользователь читает с primary.
+current_actor: ContextVar[int | None] = ContextVar("current_actor", default=None)
+_last_write: dict[int, float] = {}
+
+
+def note_write() -> None:
+    """
+    Запоминаем, что текущий пользователь только что записал (вызывается после COMMIT).
+    """
+    actor = current_actor.get()
+    if actor is None or read_engine is None:
+        return
+    now = time.monotonic()
+    _last_write[actor] = now
+    if len(_last_write) > 1000:
+        for a, t in list(_last_write.items()):
+            if now - t > READ_YOUR_WRITES_SECONDS:
+                del _last_write[a]
+
+
+def _recently_wrote() -> bool:
+    actor = current_actor.get()
+    if actor is None:
+        return False
+    t = _last_write.get(actor)
+    return t is not None and time.monotonic() - t < READ_YOUR_WRITES_SECONDS
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[AsyncSession]:
+    """
+    Одна транзакция на операцию репозитория.
+    Доменная строка и её событие outbox коммитятся вместе (один COMMIT),
+    при исключении всё откатывается.
+    """
+    if _write_lock is not None:
+        async with _write_lock:
+            async with SessionLocal() as session:
+                async with session.begin():
+                    yield session
+    else:
+        async with SessionLocal() as session:
+            async with session.begin():
+                yield session
+    note_write()
+    # снимок чтения апдейта сделан до этой записи — следующие чтения возьмут новый
+    scope = request_scope.get()
+    if scope is not None:
+        await scope.close()
+
+
+def _new_read_session() -> AsyncSession:
+    """
+    Реплика, если она есть, но primary в течение READ_YOUR_WRITES_SECONDS
+    после записи этого же пользователя (реплика могла ещё не догнать его изменения).
+    """
+    if read_engine is None or _recently_wrote():
+        return SessionLocal()
+    return ReadSessionLocal()
+
+
+class RequestScope:
+    """
+    Сессия чтения на один апдейт Telegram: создаётся при первом чтении,
+    дальше все чтения апдейта идут через неё (одно соединение, один снимок).
+    Перед отправкой ответа сессия закрывается (release_read_session) — соединение
+    не висит "idle in transaction", пока хендлер ждёт Telegram.
+    """
+
+    def __init__(self) -> None:
+        self.session: AsyncSession | None = None
+
+    async def get(self) -> AsyncSession:
+        if self.session is None:
+            session = _new_read_session()
+            if not IS_SQLITE:
+                # один снимок на фазу чтения апдейта: списки и счётчики согласованы между собой
+                try:
+                    await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+                except BaseException:
+                    # не кэшируем сломанную сессию — следующее чтение апдейта попробует заново
+                    await session.close()
+                    raise
+            self.session = session
+        return self.session
+
+    async def close(self) -> None:
+        if self.session is not None:
+            session, self.session = self.session, None
+            await session.close()
+
+
+request_scope: ContextVar[RequestScope | None] = ContextVar("request_scope", default=None)
+
+
+@asynccontextmanager
+async def request_session_scope() -> AsyncIterator[RequestScope]:
+    """
+    Открываем область апдейта (ставит DbSessionMiddleware); сессия закрывается в конце.
+    """
+    scope = RequestScope()
+    token = request_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        request_scope.reset(token)
+        await scope.close()
+
+
+async def release_read_session() -> None:
+    """
+    Конец фазы чтения апдейта: возвращаем соединение в пул и отпускаем снимок.
+    Если хендлер потом снова читает — read_session откроет новую сессию.
+    """
+    scope = request_scope.get()
+    if scope is not None:
+        await scope.close()
+
+
+@asynccontextmanager
+async def read_session() -> AsyncIterator[AsyncSession]:
+    """
+    Сессия для read-only запросов.
+    Внутри апдейта — общая сессия области (не закрывается здесь),
+    вне апдейта (воркер, CLI) — своя короткая сессия.
+    """
+    scope = request_scope.get()
+    if scope is None:
+        async with _new_read_session() as session:
+            yield session
+        return
+
+    session = await scope.get()
+    try:
+        yield session
+    except BaseException:
+        # транзакция могла остаться в ошибке — следующее чтение начнёт с новой сессии
+        await scope.close()
+        raise
+
+
+def db_now():
+    """
+    "Сейчас" на стороне БД для сравнения с due_at.
+    due_at хранится без таймзоны (локальное время), поэтому берём LOCALTIMESTAMP, а не now().
+    В SQLite даты — строки 'YYYY-MM-DD HH:MM:SS...', сравниваем с datetime('now', 'localtime').
+    """
+    if IS_SQLITE:
+        return func.datetime("now", "localtime")
+    return func.localtimestamp()
+
+
+def upsert_insert(model):
+    """
+    INSERT с поддержкой ON CONFLICT для текущего диалекта (у Postgres и SQLite он свой).
+    """
+    return sqlite.insert(model) if IS_SQLITE else postgresql.insert(model)
+
+
+def pool_stats(replica: bool = False) -> dict:
+    """
+    Метрики пула этого процесса: выдано/свободно соединений, ожидающие, время ожидания.
+    replica=True — пул реплики чтения (пустой dict, если реплики нет).
+    """
+    if replica:
+        return read_engine.pool.stats() if read_engine is not None else {}
+    return engine.pool.stats()
+
+
+async def pool_liveness_loop(interval: float = DB_LIVENESS_INTERVAL) -> None:
+    """
+    Фоновая проверка живости вместо pre-ping на каждую выдачу.
+    Если БД перезапускалась, SELECT 1 падает — сбрасываем пул,
+    и следующие запросы получат новые соединения, а не мёртвые.
+    """
+    if interval <= 0:
+        return
+    engines = [engine] if read_engine is None else [engine, read_engine]
+    while True:
+        await asyncio.sleep(interval)
+        for eng in engines:
+            try:
+                async with eng.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                print(f"DB LIVENESS ERROR ({eng.url.host}):", ex)
+                await eng.dispose()
+        if DB_POOL_LOG_STATS:
+            print("DB POOL:", pool_stats())
+            if read_engine is not None:
+                print("DB POOL (replica):", pool_stats(replica=True))
@@ -4,13 +4,89 @@
 from __future__ import annotations
 
 import asyncio
+from sqlalchemy import text
 from taskbot.storage.sql.db import engine
-from taskbot.storage.sql.models import Base
+from taskbot.storage.sql.models import Base, SEARCH_VECTOR_SQL
+from taskbot.storage.sql.outbox_retention import convert_legacy_outbox, ensure_partitions
+from taskbot.storage.sql.tasks_repo import rebuild_counters
+from taskbot.storage.sql.users_repo import link_user_tasks
+
+
+# Новые колонки для уже созданных таблиц (create_all их не добавит). Идемпотентно.
+_MIGRATIONS = [
+    "ALTER TABLE outbox ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(128)",
+    "ALTER TABLE outbox ADD COLUMN IF NOT EXISTS lease_until TIMESTAMP WITHOUT TIME ZONE",
+    "ALTER TABLE outbox ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE outbox ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP WITHOUT TIME ZONE",
+    "ALTER TABLE outbox ADD COLUMN IF NOT EXISTS dead_at TIMESTAMP WITHOUT TIME ZONE",
+    f"ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED",
+    f"ALTER TABLE common_tasks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED",
+    # владелец по users.id вместо строкового имени (заполняет link_user_tasks)
+    "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id) ON DELETE SET NULL",
+    "ALTER TABLE common_progress ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id) ON DELETE SET NULL",
+    "DROP INDEX IF EXISTS ix_tasks_assignee_status_due",
+    "DROP INDEX IF EXISTS ix_tasks_open_assignee_due",
+    "DROP INDEX IF EXISTS ix_common_progress_user",
+    "ALTER TABLE common_progress DROP CONSTRAINT IF EXISTS uq_common_progress",
+]
+
+
+async def _rekey_counters(conn) -> None:
+    """
+    user_task_counters со строковым ключом user_name удаляем — create_all создаст таблицу
+    с ключом user_id, а счётчики всё равно пересчитываются в конце init_db.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    res = await conn.execute(text(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_name = 'user_task_counters' AND column_name = 'user_name'"
+    ))
+    if res.scalar_one_or_none() is not None:
+        await conn.execute(text("DROP TABLE user_task_counters"))
+
+
+async def _payload_to_jsonb(conn) -> None:
+    """
+    outbox.payload_json: TEXT -> JSONB (один раз; на секционированной таблице ALTER идёт во все секции).
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    res = await conn.execute(text(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_name = 'outbox' AND column_name = 'payload_json'"
+    ))
+    if res.scalar_one_or_none() == "text":
+        await conn.execute(text("ALTER TABLE outbox ALTER COLUMN payload_json TYPE JSONB USING payload_json::jsonb"))
+
+
+def _create_missing_indexes(sync_conn) -> None:
+    """
+    create_all не трогает уже существующие таблицы,
+    поэтому новые индексы докатываем отдельно (если их ещё нет).
+    """
+    for table in Base.metadata.sorted_tables:
+        for idx in table.indexes:
+            idx.create(sync_conn, checkfirst=True)
 
 
 async def init_db() -> None:
     async with engine.begin() as conn:
+        await _rekey_counters(conn)
         await conn.run_sync(Base.metadata.create_all)
+        # ALTER ... IF NOT EXISTS — Postgres; SQLite-база всегда создаётся сразу с нынешней схемой
+        if conn.dialect.name == "postgresql":
+            for stmt in _MIGRATIONS:
+                await conn.execute(text(stmt))
+        # user_id по имени для строк без владельца (до индексов — они строятся уже по заполненной колонке)
+        await link_user_tasks(conn)
+        # outbox -> помесячные секции (старую несекционированную таблицу переносим)
+        await convert_legacy_outbox(conn)
+        await ensure_partitions(conn)
+        await _payload_to_jsonb(conn)
+        await conn.run_sync(_create_missing_indexes)
+        # счётчики задач пересчитываем с нуля (дальше их ведут мутации)
+        await rebuild_counters(conn)
 
 
 if __name__ == "__main__":
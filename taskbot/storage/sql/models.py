@@ -5,16 +5,28 @@ from __future__ import annotations
 
 from datetime import datetime
 from sqlalchemy import (
-    String, Integer, BigInteger, DateTime, Text, ForeignKey,
-    UniqueConstraint, Index
+    String, Integer, BigInteger, DateTime, Text, ForeignKey, JSON, Computed,
+    UniqueConstraint, Index, text
 )
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
+from taskbot.config import STATUS_DONE, STATUS_ARCHIVE, IS_SQLITE
+
 
 class Base(DeclarativeBase):
     pass
 
 
+# Полнотекстовый поиск (только Postgres): русская морфология + "simple" для имён, кодов, латиницы.
+# Колонка генерируемая — её не нужно заполнять в коде; по ней GIN-индекс.
+SEARCH_VECTOR_SQL = "to_tsvector('russian', coalesce(task_text, '')) || to_tsvector('simple', coalesce(task_text, ''))"
+
+
+def _search_vector():
+    return mapped_column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True), deferred=True)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -28,16 +40,40 @@ class Task(Base):
     """
     Личные задачи.
     task_id = автонумерация (id).
+    Владелец — user_id (FK users.id): все выборки и join'ы идут по нему, переименование
+    пользователя меняет одну строку users. assignee_name — вкладка в Google, на которой
+    лежит строка задачи (имя на момент создания); user_id пуст у задач листа "Общие"
+    и у листов без регистрации (после /unregister задачи остаются и привязываются
+    обратно при регистрации с тем же именем).
     """
     __tablename__ = "tasks"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)  # порядковый номер
+    user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     assignee_name: Mapped[str] = mapped_column(String(64), index=True)  # имя вкладки (как раньше)
     task_text: Mapped[str] = mapped_column(Text)
     from_name: Mapped[str] = mapped_column(String(128))
     due_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
     status: Mapped[str] = mapped_column(String(16), index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    if not IS_SQLITE:
+        search_vector = _search_vector()
+
+    __table_args__ = (
+        # списки пользователя: фильтр по статусу + сортировка по сроку
+        Index("ix_tasks_user_status_due", "user_id", "status", "due_at"),
+    )
+
+
+# Частичный индекс только по открытым задачам: /my и /overdue читают его,
+# и их стоимость зависит от числа открытых задач, а не от всей истории.
+Index(
+    "ix_tasks_open_user_due",
+    Task.user_id,
+    Task.due_at,
+    postgresql_where=Task.status.not_in([STATUS_DONE, STATUS_ARCHIVE]),
+    sqlite_where=Task.status.not_in([STATUS_DONE, STATUS_ARCHIVE]),
+)
 
 
 class CommonTask(Base):
@@ -52,24 +88,69 @@ class CommonTask(Base):
     due_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
     status: Mapped[str] = mapped_column(String(16), index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    if not IS_SQLITE:
+        search_vector = _search_vector()
+
+
+if not IS_SQLITE:
+    Index("ix_tasks_search", Task.search_vector, postgresql_using="gin")
+    Index("ix_common_tasks_search", CommonTask.search_vector, postgresql_using="gin")
 
 
 class CommonProgress(Base):
     """
     Прогресс по общим задачам: кто закрыл.
-    UNIQUE(task_id, user_name) — чтобы без дублей.
+    UNIQUE(task_id, user_id) — чтобы без дублей.
+    user_name — имя на момент отметки (для лога в Google), ключ — user_id.
     """
     __tablename__ = "common_progress"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     task_id: Mapped[int] = mapped_column(Integer, ForeignKey("common_tasks.id", ondelete="CASCADE"))
+    user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     user_name: Mapped[str] = mapped_column(String(64))
     status: Mapped[str] = mapped_column(String(16))
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     __table_args__ = (
-        UniqueConstraint("task_id", "user_name", name="uq_common_progress"),
-        Index("ix_common_progress_user", "user_name"),
+        Index("uq_common_progress_user", "task_id", "user_id", unique=True),
+        Index("ix_common_progress_user_id", "user_id"),
+    )
+
+
+class UserTaskCounter(Base):
+    """
+    Счётчики задач по пользователю, обновляются в тех же транзакциях, что и сами задачи
+    (см. counters.py). Просрочка не хранится — считается при чтении по индексу due_at.
+    open_count/done_count — личные задачи; common_done_count — сколько ОТКРЫТЫХ общих
+    задач пользователь закрыл у себя. Строка с user_id = COMMON_COUNTER_KEY (0)
+    хранит счётчики самих общих задач, поэтому FK на users здесь нет.
+    """
+    __tablename__ = "user_task_counters"
+
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    open_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    done_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    common_done_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
+
+class ReminderSent(Base):
+    """
+    Отправленные напоминания о сроке (см. tg/reminders.py) — чтобы после рестарта
+    или с другой реплики бота не слать их повторно.
+    due_at входит в ключ: после переноса срока напоминания придут заново.
+    """
+    __tablename__ = "reminders_sent"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(8))       # task / common
+    task_id: Mapped[int] = mapped_column(Integer)
+    reminder: Mapped[str] = mapped_column(String(8))   # soon / overdue
+    due_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    sent_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("kind", "task_id", "reminder", "due_at", name="uq_reminders_sent"),
     )
 
 
@@ -77,12 +158,38 @@ class Outbox(Base):
     """
     Очередь событий для зеркалирования в Google Sheets.
     sync_worker раз в минуту берёт пачку NOT synced.
+    Пачка берётся под аренду (claimed_by/lease_until), чтобы несколько воркеров
+    не применяли одни и те же события; просроченная аренда забирается заново.
+    Упавшее событие откладывается с экспоненциальной задержкой (attempts/next_attempt_at),
+    после OUTBOX_MAX_ATTEMPTS попыток — в dead-letter (dead_at), вернуть: outbox_requeue.
+
+    В PostgreSQL таблица секционирована по месяцам (RANGE по created_at),
+    поэтому created_at входит в первичный ключ. Старые обработанные секции
+    удаляет outbox_retention (см. outbox_retention.py).
+    В SQLite секций нет, а автоинкремент возможен только у одиночного INTEGER PRIMARY KEY,
+    поэтому там ключ — только id.
     """
     __tablename__ = "outbox"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     event_type: Mapped[str] = mapped_column(String(64), index=True)   # например TASK_CREATED
-    payload_json: Mapped[str] = mapped_column(Text)                   # JSON строка
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # JSONB: драйвер отдаёт dict, а поля payload доступны в SQL (payload["task_id"].astext)
+    payload: Mapped[dict] = mapped_column("payload_json", JSON().with_variant(JSONB(), "postgresql"))
+    created_at: Mapped[datetime] = mapped_column(DateTime, primary_key=not IS_SQLITE, default=datetime.utcnow)
     processed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    claimed_by: Mapped[str | None] = mapped_column(String(128), nullable=True)  # id воркера
+    lease_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # до когда аренда (UTC)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")  # сколько раз падало применение
+    next_attempt_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # не брать раньше (backoff)
+    dead_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # dead-letter: больше не пробуем
+
+    __table_args__ = (
+        # выборка пачки: WHERE processed_at IS NULL ORDER BY id — индекс только по необработанным
+        Index(
+            "ix_outbox_pending", "id",
+            postgresql_where=text("processed_at IS NULL"),
+            sqlite_where=text("processed_at IS NULL"),
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
@@ -0,0 +1,74 @@
+# taskbot/storage/sql/notify.py
+# Postgres LISTEN/NOTIFY: отправка уведомлений из транзакции и слушатель через asyncpg
+
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from taskbot.config import DATABASE_DIRECT_URL, IS_SQLITE
+
+
+def asyncpg_dsn() -> str:
+    """
+    DATABASE_DIRECT_URL для SQLAlchemy ("postgresql+asyncpg://...") -> DSN для голого asyncpg.
+    LISTEN держит сессию, поэтому через PgBouncer в transaction mode не работает —
+    слушатель ходит в Postgres напрямую.
+    """
+    return DATABASE_DIRECT_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+async def notify(session: AsyncSession, channel: str, payload: str = "") -> None:
+    """
+    NOTIFY внутри транзакции сессии: Postgres доставит его только после COMMIT
+    (и схлопнет одинаковые уведомления одной транзакции).
+    На SQLite NOTIFY нет — ничего не делаем (подписчики живут опросом/TTL).
+    """
+    if IS_SQLITE:
+        return
+    await session.execute(select(func.pg_notify(channel, payload)))
+
+
+async def listen_forever(
+    channel: str,
+    on_notify: Callable[[str], None],
+    on_connect: Callable[[], Awaitable[None] | None] | None = None,
+    retry_delay: float = 5.0,
+) -> None:
+    """
+    Держим отдельное соединение с LISTEN channel и переподключаемся при обрыве.
+    on_connect вызывается после каждого (пере)подключения — пока соединения не было,
+    уведомления могли потеряться, и подписчик должен это учесть (например, сбросить кеш).
+    На SQLite LISTEN нет: сразу выходим, подписчик остаётся на опросе/TTL.
+    """
+    if IS_SQLITE:
+        return
+
+    import asyncpg  # только для Postgres; на SQLite-установке asyncpg может не быть
+
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(asyncpg_dsn())
+            lost = asyncio.Event()
+            conn.add_termination_listener(lambda _c: lost.set())
+            await conn.add_listener(channel, lambda _c, _pid, _ch, payload: on_notify(payload))
+
+            if on_connect is not None:
+                res = on_connect()
+                if asyncio.iscoroutine(res):
+                    await res
+
+            await lost.wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            print(f"LISTEN {channel} ERROR:", ex)
+        finally:
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+
+        await asyncio.sleep(retry_delay)
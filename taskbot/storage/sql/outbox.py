@@ -3,53 +3,264 @@
 
 from __future__ import annotations
 
-import json
-from datetime import datetime
-from sqlalchemy import select, update
-from taskbot.storage.sql.db import SessionLocal
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, insert, and_, or_, bindparam, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from taskbot.config import (
+    IS_SQLITE,
+    OUTBOX_LEASE_SECONDS,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_RETRY_BASE_SECONDS,
+    OUTBOX_RETRY_MAX_SECONDS,
+)
+from taskbot.storage.sql.db import SessionLocal, unit_of_work
 from taskbot.storage.sql.models import Outbox
+from taskbot.storage.sql.notify import notify
 
+# канал NOTIFY: "в outbox есть новые события" (sync_worker делает LISTEN)
+OUTBOX_CHANNEL = "taskbot_outbox"
 
-async def outbox_add(event_type: str, payload: dict) -> None:
+
+async def outbox_add(event_type: str, payload: dict, session: AsyncSession | None = None) -> None:
     """
     Кладём событие в outbox. payload сериализуем в JSON.
+    Если передан session — пишем в его транзакцию (commit делает вызывающий),
+    иначе открываем свою.
+    Вместе с событием шлём NOTIFY — воркер проснётся сразу после COMMIT.
     """
-    async with SessionLocal() as session:
-        session.add(Outbox(event_type=event_type, payload_json=json.dumps(payload, ensure_ascii=False)))
-        await session.commit()
+    stmt = insert(Outbox).values(event_type=event_type, payload=payload)
+    if session is not None:
+        await session.execute(stmt)
+        await notify(session, OUTBOX_CHANNEL)
+        return
+    async with unit_of_work() as s:
+        await s.execute(stmt)
+        await notify(s, OUTBOX_CHANNEL)
 
 
-async def outbox_fetch_batch(limit: int = 200) -> list[Outbox]:
+async def outbox_add_many(events: list[tuple[str, dict]], session: AsyncSession | None = None) -> None:
     """
-    Берём пачку необработанных событий.
+    Пачка событий одним INSERT (executemany / multi-row VALUES).
+    events: [(event_type, payload), ...]
     """
-    async with SessionLocal() as session:
-        q = select(Outbox).where(Outbox.processed_at.is_(None)).order_by(Outbox.id).limit(limit)
-        res = await session.execute(q)
-        return list(res.scalars().all())
+    if not events:
+        return
+    rows = [
+        {"event_type": etype, "payload": payload}
+        for etype, payload in events
+    ]
+    if session is not None:
+        await session.execute(insert(Outbox), rows)
+        await notify(session, OUTBOX_CHANNEL)
+        return
+    async with unit_of_work() as s:
+        await s.execute(insert(Outbox), rows)
+        await notify(s, OUTBOX_CHANNEL)
+
+
+def _same_key(older, newer):
+    """
+    older и newer — события одной задачи: тот же лист и тот же task_id в payload.
+    У общих задач sheet нет — ключ только task_id (COMMON_CREATED/STATUS/PROGRESS).
+    """
+    return and_(
+        older.payload["task_id"].as_string() == newer.payload["task_id"].as_string(),
+        func.coalesce(older.payload["sheet"].as_string(), "") == func.coalesce(newer.payload["sheet"].as_string(), ""),
+    )
+
+
+async def outbox_claim_batch(worker_id: str, limit: int = 200, lease_seconds: int = OUTBOX_LEASE_SECONDS) -> list:
+    """
+    Забираем пачку необработанных событий под аренду одним запросом:
+    UPDATE outbox SET claimed_by, lease_until WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED) RETURNING ...
+    Строки, которые прямо сейчас забирает другой воркер, пропускаются (SKIP LOCKED);
+    события с истёкшей арендой (воркер упал) забираются заново.
+    События одной задачи применяются строго по порядку и одним воркером: событие не берём,
+    пока более раннее событие той же задачи арендовано другим воркером, отложено (backoff)
+    или лежит в dead-letter — иначе, например, STATUS обогнал бы упавший CREATED
+    и потерялся (строки в листе ещё нет).
+    Сами захваты сериализуются advisory-локом (в SQLite — общей блокировкой записи),
+    иначе параллельный захват не увидел бы ещё не закоммиченную аренду соседа.
+    Отложенные (next_attempt_at в будущем) и dead-letter события не берём,
+    чтобы упавшие события не блокировали голову очереди.
+    Возвращаем строки (id, event_type, payload, attempts) по возрастанию id; payload — уже dict.
+    """
+    now = datetime.utcnow()
+    older = aliased(Outbox)
+    blocked = (
+        select(older.id)
+        .where(
+            older.id < Outbox.id,
+            older.processed_at.is_(None),
+            or_(
+                older.lease_until >= now,
+                older.next_attempt_at > now,
+                older.dead_at.is_not(None),
+            ),
+            _same_key(older, Outbox),
+        )
+        .exists()
+    )
+    candidates = (
+        select(Outbox.id)
+        .where(
+            Outbox.processed_at.is_(None),
+            Outbox.dead_at.is_(None),
+            or_(Outbox.next_attempt_at.is_(None), Outbox.next_attempt_at <= now),
+            or_(Outbox.lease_until.is_(None), Outbox.lease_until < now),
+            ~blocked,
+        )
+        .order_by(Outbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+    async with unit_of_work() as session:
+        if not IS_SQLITE:
+            await session.execute(select(func.pg_advisory_xact_lock(func.hashtext(OUTBOX_CHANNEL))))
+        res = await session.execute(
+            update(Outbox)
+            .where(Outbox.id.in_(candidates.scalar_subquery()))
+            .values(claimed_by=worker_id, lease_until=now + timedelta(seconds=lease_seconds))
+            .returning(Outbox.id, Outbox.event_type, Outbox.payload, Outbox.attempts)
+            .execution_options(synchronize_session=False)
+        )
+        rows = res.all()
+
+    return sorted(rows, key=lambda r: r.id)
 
 
-async def outbox_mark_processed(ids: list[int]) -> None:
+async def outbox_mark_processed(ids: list[int], worker_id: str | None = None) -> None:
     """
-    Отмечаем события обработанными (processed_at=now)
+    Отмечаем события обработанными (processed_at=now) и снимаем аренду.
+    С worker_id — только те, что всё ещё арендованы этим воркером.
     """
     if not ids:
         return
-    async with SessionLocal() as session:
+    q = update(Outbox).where(Outbox.id.in_(ids))
+    if worker_id is not None:
+        q = q.where(Outbox.claimed_by == worker_id)
+    async with unit_of_work() as session:
         await session.execute(
-            update(Outbox)
-            .where(Outbox.id.in_(ids))
-            .values(processed_at=datetime.utcnow(), error=None)
+            q.values(processed_at=datetime.utcnow(), error=None, claimed_by=None, lease_until=None)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    """
+    Экспоненциальная задержка с джиттером: base*2^(attempts-1), не больше max,
+    случайно в диапазоне [50%, 100%] — чтобы повторы разных событий не шли стеной.
+    """
+    delay = min(OUTBOX_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), OUTBOX_RETRY_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+async def outbox_mark_errors(failures: list[tuple[int, int, str]], worker_id: str | None = None) -> None:
+    """
+    Записываем ошибки пачкой одним UPDATE (executemany).
+    failures: [(event_id, attempts_before, error), ...]
+    attempts += 1; next_attempt_at = now + backoff; после OUTBOX_MAX_ATTEMPTS — dead_at.
+    Аренду снимаем. С worker_id — только у событий, всё ещё арендованных этим воркером
+    (аренда истекла и событие забрал другой — его аренду не трогаем).
+    """
+    if not failures:
+        return
+    now = datetime.utcnow()
+    rows = []
+    for event_id, attempts_before, error in failures:
+        attempts = int(attempts_before or 0) + 1
+        dead = attempts >= OUTBOX_MAX_ATTEMPTS
+        rows.append({
+            "b_id": event_id,
+            "b_attempts": attempts,
+            "b_next": None if dead else now + _retry_delay(attempts),
+            "b_dead": now if dead else None,
+            "b_error": error,
+        })
+
+    t = Outbox.__table__
+    stmt = update(t).where(t.c.id == bindparam("b_id"))
+    if worker_id is not None:
+        stmt = stmt.where(t.c.claimed_by == worker_id)
+    stmt = (
+        stmt
+        .values(
+            attempts=bindparam("b_attempts"),
+            next_attempt_at=bindparam("b_next"),
+            dead_at=bindparam("b_dead"),
+            error=bindparam("b_error"),
+            claimed_by=None,
+            lease_until=None,
         )
-        await session.commit()
+    )
+    async with unit_of_work() as session:
+        await session.execute(stmt, rows)
 
 
-async def outbox_mark_error(event_id: int, error: str) -> None:
+async def outbox_mark_error(event_id: int, error: str, attempts_before: int = 0) -> None:
     """
-    Записываем ошибку (событие останется не processed — можно потом обработать вручную/повторно)
+    Одна ошибка (обёртка над outbox_mark_errors).
+    """
+    await outbox_mark_errors([(event_id, attempts_before, error)])
+
+
+async def outbox_tail(after_id: int, limit: int = 500) -> list:
+    """
+    События с id > after_id по возрастанию: (id, event_type, payload).
+    Только чтение, без аренды — для подписчиков в других процессах (напоминания бота),
+    обработку для Google это не трогает.
+    id выдаются при INSERT, а видны после COMMIT, поэтому событие параллельной транзакции
+    с меньшим id изредка можно пропустить — подписчик должен периодически перечитывать своё состояние.
     """
     async with SessionLocal() as session:
-        await session.execute(
-            update(Outbox).where(Outbox.id == event_id).values(error=error)
+        res = await session.execute(
+            select(Outbox.id, Outbox.event_type, Outbox.payload)
+            .where(Outbox.id > after_id)
+            .order_by(Outbox.id)
+            .limit(limit)
+        )
+        return list(res.all())
+
+
+async def outbox_last_id() -> int:
+    async with SessionLocal() as session:
+        res = await session.execute(select(func.max(Outbox.id)))
+        return int(res.scalar() or 0)
+
+
+async def outbox_dead_list(limit: int = 50, task_id: int | None = None, sheet: str | None = None) -> list:
+    """
+    События в dead-letter (для админа): (id, event_type, attempts, error, dead_at).
+    task_id/sheet фильтруют по полям payload прямо в SQL (JSONB), без разбора строк в Python.
+    """
+    q = (
+        select(Outbox.id, Outbox.event_type, Outbox.attempts, Outbox.error, Outbox.dead_at)
+        .where(Outbox.dead_at.is_not(None), Outbox.processed_at.is_(None))
+    )
+    if task_id is not None:
+        q = q.where(Outbox.payload["task_id"].as_integer() == task_id)
+    if sheet is not None:
+        q = q.where(Outbox.payload["sheet"].as_string() == sheet)
+
+    async with SessionLocal() as session:
+        res = await session.execute(q.order_by(Outbox.id).limit(limit))
+        return list(res.all())
+
+
+async def outbox_requeue(ids: list[int] | None = None) -> int:
+    """
+    Возвращаем dead-letter события в очередь (все или по id): attempts=0, без задержки.
+    """
+    q = update(Outbox).where(Outbox.dead_at.is_not(None), Outbox.processed_at.is_(None))
+    if ids:
+        q = q.where(Outbox.id.in_(ids))
+    async with unit_of_work() as session:
+        res = await session.execute(
+            q.values(attempts=0, next_attempt_at=None, dead_at=None, error=None)
+            .execution_options(synchronize_session=False)
         )
-        await session.commit()
+        await notify(session, OUTBOX_CHANNEL)
+    return int(res.rowcount or 0)
@@ -0,0 +1,180 @@
+# taskbot/storage/sql/outbox_retention.py
+# Помесячные секции outbox (PostgreSQL) и очистка старых обработанных событий
+
+from __future__ import annotations
+
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from taskbot.config import OUTBOX_RETENTION_DAYS, OUTBOX_RETENTION_ARCHIVE
+from taskbot.storage.sql.db import engine
+
+_PARTITION_RE = re.compile(r"^outbox_(\d{4})(\d{2})$")
+
+
+def _month_start(d: datetime) -> datetime:
+    return datetime(d.year, d.month, 1)
+
+
+def _add_months(d: datetime, n: int) -> datetime:
+    m = d.month - 1 + n
+    return datetime(d.year + m // 12, m % 12 + 1, 1)
+
+
+async def _relation_exists(conn: AsyncConnection, name: str) -> bool:
+    res = await conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name})
+    return bool(res.scalar())
+
+
+async def ensure_partitions(conn: AsyncConnection, months_ahead: int = 2) -> None:
+    """
+    Секции outbox_YYYYMM на текущий месяц и months_ahead вперёд + DEFAULT (на всякий случай).
+    Если строки месяца уже попали в DEFAULT (секцию вовремя не создали), PostgreSQL не даст
+    создать секцию поверх них — переносим их: копия -> DELETE из DEFAULT -> секция -> INSERT обратно.
+    Идемпотентно.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+
+    has_default = await _relation_exists(conn, "outbox_default")
+    start = _month_start(datetime.utcnow())
+    for i in range(months_ahead + 1):
+        lo, hi = _add_months(start, i), _add_months(start, i + 1)
+        name = f"outbox_{lo:%Y%m}"
+        if await _relation_exists(conn, name):
+            continue
+
+        bounds = {"lo": lo, "hi": hi}
+        moved = False
+        if has_default:
+            # вставки в outbox ждут до COMMIT: новая строка месяца в DEFAULT сорвала бы CREATE ниже
+            await conn.execute(text("LOCK TABLE outbox IN ACCESS EXCLUSIVE MODE"))
+            res = await conn.execute(text(
+                "SELECT EXISTS (SELECT 1 FROM outbox_default WHERE created_at >= :lo AND created_at < :hi)"
+            ), bounds)
+            moved = bool(res.scalar())
+        if moved:
+            await conn.execute(text(
+                "CREATE TEMP TABLE outbox_moving ON COMMIT DROP AS "
+                "SELECT * FROM outbox_default WHERE created_at >= :lo AND created_at < :hi"
+            ), bounds)
+            await conn.execute(text("DELETE FROM outbox_default WHERE created_at >= :lo AND created_at < :hi"), bounds)
+
+        await conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF outbox "
+            f"FOR VALUES FROM ('{lo:%Y-%m-%d}') TO ('{hi:%Y-%m-%d}')"
+        ))
+
+        if moved:
+            await conn.execute(text(f"INSERT INTO {name} SELECT * FROM outbox_moving"))
+            await conn.execute(text("DROP TABLE outbox_moving"))
+
+    if not has_default:
+        await conn.execute(text("CREATE TABLE outbox_default PARTITION OF outbox DEFAULT"))
+
+
+async def convert_legacy_outbox(conn: AsyncConnection) -> None:
+    """
+    Если outbox ещё обычная (не секционированная) таблица — переносим её в секционированную:
+    rename -> create -> copy -> setval -> drop. Всё в транзакции conn.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+
+    res = await conn.execute(text("SELECT relkind FROM pg_class WHERE relname = 'outbox' AND relkind IN ('r', 'p')"))
+    relkind = res.scalar_one_or_none()
+    if relkind != "r":
+        return
+
+    # освобождаем имена (таблица, PK, последовательность, индексы) под новую таблицу
+    await conn.execute(text("ALTER TABLE outbox RENAME TO outbox_legacy"))
+    await conn.execute(text("ALTER TABLE outbox_legacy RENAME CONSTRAINT outbox_pkey TO outbox_legacy_pkey"))
+    await conn.execute(text("ALTER SEQUENCE IF EXISTS outbox_id_seq RENAME TO outbox_legacy_id_seq"))
+    await conn.execute(text("DROP INDEX IF EXISTS ix_outbox_event_type"))
+    await conn.execute(text("DROP INDEX IF EXISTS ix_outbox_pending"))
+
+    from taskbot.storage.sql.models import Outbox
+    await conn.run_sync(Outbox.__table__.create)
+    await ensure_partitions(conn)
+
+    await conn.execute(text(
+        "INSERT INTO outbox (id, event_type, payload_json, created_at, processed_at, error, "
+        "claimed_by, lease_until, attempts, next_attempt_at, dead_at) "
+        "SELECT id, event_type, payload_json::jsonb, COALESCE(created_at, now() AT TIME ZONE 'utc'), "
+        "processed_at, error, claimed_by, lease_until, attempts, next_attempt_at, dead_at FROM outbox_legacy"
+    ))
+    await conn.execute(text(
+        "SELECT setval(pg_get_serial_sequence('outbox', 'id'), COALESCE((SELECT max(id) FROM outbox), 0) + 1, false)"
+    ))
+    await conn.execute(text("DROP TABLE outbox_legacy"))
+
+
+async def outbox_retention(days: int = OUTBOX_RETENTION_DAYS, archive: bool = OUTBOX_RETENTION_ARCHIVE) -> int:
+    """
+    Создаём секции на ближайшие месяцы (всегда, даже при days=0) и чистим обработанные события
+    старше days дней.
+    - Секции outbox_YYYYMM, целиком старше cutoff и без необработанных событий,
+      удаляем (или отсоединяем и переименовываем в outbox_archived_YYYYMM при archive=True) —
+      это дешевле любого DELETE.
+    - Остальное (DEFAULT-секция, секции с хвостами) — DELETE только обработанных строк;
+      при archive=True строки перед удалением копируются в outbox_archived.
+    Возвращаем число удалённых/отсоединённых строк (примерно).
+    """
+    async with engine.begin() as conn:
+        await ensure_partitions(conn)
+
+    if days <= 0:
+        return 0
+
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    removed = 0
+
+    async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            res = await conn.execute(text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = 'outbox'"
+            ))
+            for (name,) in res.all():
+                m = _PARTITION_RE.match(name)
+                if not m:
+                    continue
+                hi = _add_months(datetime(int(m.group(1)), int(m.group(2)), 1), 1)
+                if hi > cutoff:
+                    continue
+
+                pending = await conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {name} WHERE processed_at IS NULL)"))
+                if pending.scalar():
+                    continue
+
+                cnt = await conn.execute(text(f"SELECT count(*) FROM {name}"))
+                removed += int(cnt.scalar() or 0)
+
+                await conn.execute(text(f"ALTER TABLE outbox DETACH PARTITION {name}"))
+                if archive:
+                    await conn.execute(text(f"ALTER TABLE {name} RENAME TO outbox_archived_{m.group(1)}{m.group(2)}"))
+                else:
+                    await conn.execute(text(f"DROP TABLE {name}"))
+
+        old_rows = "processed_at IS NOT NULL AND created_at < :cutoff"
+        if archive and conn.dialect.name == "postgresql":
+            await conn.execute(text("CREATE TABLE IF NOT EXISTS outbox_archived (LIKE outbox)"))
+            res = await conn.execute(text(
+                f"WITH moved AS (DELETE FROM outbox WHERE {old_rows} RETURNING *) "
+                "INSERT INTO outbox_archived SELECT * FROM moved"
+            ), {"cutoff": cutoff})
+        elif archive:
+            # SQLite: DELETE ... RETURNING в CTE нет; писатель один, поэтому копия и DELETE видят одни строки
+            await conn.execute(text("CREATE TABLE IF NOT EXISTS outbox_archived AS SELECT * FROM outbox WHERE 0"))
+            await conn.execute(text(f"INSERT INTO outbox_archived SELECT * FROM outbox WHERE {old_rows}"), {"cutoff": cutoff})
+            res = await conn.execute(text(f"DELETE FROM outbox WHERE {old_rows}"), {"cutoff": cutoff})
+        else:
+            res = await conn.execute(text(f"DELETE FROM outbox WHERE {old_rows}"), {"cutoff": cutoff})
+        removed += int(res.rowcount or 0)
+
+    return removed
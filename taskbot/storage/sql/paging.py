@@ -0,0 +1,126 @@
+# taskbot/storage/sql/paging.py
+# Keyset-пагинация списков задач по (due_at, kind, id)
+#
+# Порядок: due_at ASC NULLS LAST, затем kind (0 — личная, 1 — общая), затем id.
+# Курсор — позиция первой/последней строки страницы, кодируется в короткую строку
+# (влезает в callback_data Telegram, лимит 64 байта).
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable
+
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+_DUE_FMT = "%Y%m%d%H%M"
+
+
+@dataclass(frozen=True)
+class PageCursor:
+    due_at: datetime | None
+    kind: int
+    id: int
+
+
+@dataclass
+class Page:
+    rows: list = field(default_factory=list)
+    has_prev: bool = False
+    has_next: bool = False
+    first_cursor: str | None = None
+    last_cursor: str | None = None
+
+
+def encode_cursor(c: PageCursor) -> str:
+    due = c.due_at.strftime(_DUE_FMT) if c.due_at else "-"
+    return f"{due}.{c.kind}.{c.id}"
+
+
+def decode_cursor(raw: str | None) -> PageCursor | None:
+    """
+    Битый/пустой курсор -> None (покажем первую страницу).
+    """
+    if not raw:
+        return None
+    try:
+        due_raw, kind_raw, id_raw = raw.split(".")
+        due_at = None if due_raw == "-" else datetime.strptime(due_raw, _DUE_FMT)
+        return PageCursor(due_at=due_at, kind=int(kind_raw), id=int(id_raw))
+    except ValueError:
+        return None
+
+
+def _keyset_where(due_col, kind_col, id_col, c: PageCursor, backward: bool):
+    """
+    Строки строго после курсора (или строго до — для backward) в порядке
+    due_at ASC NULLS LAST, kind, id.
+    """
+    ties = tuple_(kind_col, id_col)
+    tie_key = tuple_(c.kind, c.id)
+
+    if not backward:
+        if c.due_at is None:
+            return and_(due_col.is_(None), ties > tie_key)
+        return or_(
+            due_col > c.due_at,
+            due_col.is_(None),
+            and_(due_col == c.due_at, ties > tie_key),
+        )
+
+    if c.due_at is None:
+        return or_(due_col.is_not(None), and_(due_col.is_(None), ties < tie_key))
+    return or_(
+        due_col < c.due_at,
+        and_(due_col == c.due_at, ties < tie_key),
+    )
+
+
+def _order(due_col, kind_col, id_col, backward: bool) -> list:
+    if backward:
+        return [due_col.desc().nulls_first(), kind_col.desc(), id_col.desc()]
+    return [due_col.asc().nulls_last(), kind_col.asc(), id_col.asc()]
+
+
+async def fetch_page(
+    session: AsyncSession,
+    q,
+    due_col,
+    kind_col,
+    id_col,
+    cursor: str | None,
+    direction: str,
+    limit: int,
+    to_item: Callable[[Any], Any],
+) -> Page:
+    """
+    direction: "n" — страница после курсора, "p" — страница перед курсором.
+    Без курсора — первая страница. Берём limit+1 строк, чтобы узнать, есть ли ещё.
+    to_item превращает строку результата в элемент страницы.
+    """
+    c = decode_cursor(cursor)
+    backward = direction == "p" and c is not None
+
+    if c is not None:
+        q = q.where(_keyset_where(due_col, kind_col, id_col, c, backward))
+    q = q.order_by(*_order(due_col, kind_col, id_col, backward)).limit(limit + 1)
+
+    res = await session.execute(q)
+    rows = res.all()
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    if backward:
+        rows.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = c is not None, more
+
+    page = Page(rows=[to_item(r) for r in rows], has_prev=has_prev, has_next=has_next)
+    if rows:
+        first, last = rows[0], rows[-1]
+        page.first_cursor = encode_cursor(PageCursor(first.due_at, int(first.kind), int(first.id)))
+        page.last_cursor = encode_cursor(PageCursor(last.due_at, int(last.kind), int(last.id)))
+    return page
@@ -0,0 +1,62 @@
+# taskbot/storage/sql/pool.py
+# Пул соединений с метриками: сколько соединений выдано, сколько корутин ждут, сколько ждали
+
+from __future__ import annotations
+
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class MeteredPool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool, который считает выдачи соединений и время ожидания.
+    Ожидающие — корутины, которые сейчас внутри checkout (пул исчерпан).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiting = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.waiting -= 1
+            waited = time.perf_counter() - started
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        self.checkouts += 1
+        return conn
+
+    def recreate(self):
+        # engine.dispose() пересоздаёт пул — счётчики переносим, чтобы метрики не обнулялись
+        new = super().recreate()
+        new.checkouts = self.checkouts
+        new.timeouts = self.timeouts
+        new.wait_total = self.wait_total
+        new.wait_max = self.wait_max
+        return new
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "waiting": self.waiting,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 2),
+        }
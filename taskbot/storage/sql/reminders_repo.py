@@ -0,0 +1,127 @@
+# taskbot/storage/sql/reminders_repo.py
+# Напоминания о сроках: выборка окна по due_at и учёт отправленного (reminders_sent)
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy import select, delete, literal, union_all, and_, or_
+from taskbot.config import STATUS_DONE, STATUS_ARCHIVE
+from taskbot.storage.sql.db import SessionLocal, unit_of_work, upsert_insert
+from taskbot.storage.sql.models import Task, CommonTask, CommonProgress, User, ReminderSent
+
+KIND_TASK = "task"
+KIND_COMMON = "common"
+
+
+class DueItem(NamedTuple):
+    kind: str
+    task_id: int
+    due_at: datetime
+
+
+def _open_due(model):
+    return and_(model.status.not_in([STATUS_DONE, STATUS_ARCHIVE]), model.due_at.is_not(None))
+
+
+async def reminder_window(lo: datetime, hi: datetime) -> list[DueItem]:
+    """
+    Открытые личные и общие задачи со сроком в [lo, hi] — один запрос по индексам due_at.
+    """
+    personal = select(literal(KIND_TASK).label("kind"), Task.id, Task.due_at).where(
+        _open_due(Task), Task.due_at >= lo, Task.due_at <= hi,
+    )
+    common = select(literal(KIND_COMMON).label("kind"), CommonTask.id, CommonTask.due_at).where(
+        _open_due(CommonTask), CommonTask.due_at >= lo, CommonTask.due_at <= hi,
+    )
+    async with SessionLocal() as session:
+        res = await session.execute(union_all(personal, common))
+        return [DueItem(r.kind, int(r.id), r.due_at) for r in res]
+
+
+async def reminder_lookup(task_ids: set[int], common_ids: set[int]) -> list[DueItem]:
+    """
+    Текущий срок задач, упомянутых в событиях outbox. Закрытых, удалённых и без срока в ответе нет.
+    """
+    parts = []
+    if task_ids:
+        parts.append(select(literal(KIND_TASK).label("kind"), Task.id, Task.due_at).where(
+            Task.id.in_(task_ids), _open_due(Task),
+        ))
+    if common_ids:
+        parts.append(select(literal(KIND_COMMON).label("kind"), CommonTask.id, CommonTask.due_at).where(
+            CommonTask.id.in_(common_ids), _open_due(CommonTask),
+        ))
+    if not parts:
+        return []
+    async with SessionLocal() as session:
+        res = await session.execute(union_all(*parts) if len(parts) > 1 else parts[0])
+        return [DueItem(r.kind, int(r.id), r.due_at) for r in res]
+
+
+async def reminders_sent_since(lo: datetime) -> set[tuple[str, int, str, datetime]]:
+    """
+    Уже отправленные напоминания по срокам >= lo: {(kind, task_id, reminder, due_at)}.
+    """
+    async with SessionLocal() as session:
+        res = await session.execute(
+            select(ReminderSent.kind, ReminderSent.task_id, ReminderSent.reminder, ReminderSent.due_at)
+            .where(ReminderSent.due_at >= lo)
+        )
+        return {(r.kind, int(r.task_id), r.reminder, r.due_at) for r in res}
+
+
+async def reminder_claim(kind: str, task_id: int, reminder: str, due_at: datetime) -> tuple[str, list[int]] | None:
+    """
+    Одна транзакция: проверяем, что задача всё ещё открыта с этим сроком, и записываем
+    напоминание в reminders_sent (ON CONFLICT DO NOTHING). Запись делается ДО отправки:
+    при падении между ними напоминание потеряется, но не придёт дважды (и с двух реплик тоже).
+    Возвращаем (текст задачи, telegram_id получателей) или None — слать не нужно.
+    """
+    async with unit_of_work() as session:
+        if kind == KIND_TASK:
+            row = (await session.execute(
+                select(Task.task_text, User.telegram_id)
+                .outerjoin(User, User.id == Task.user_id)
+                .where(Task.id == task_id, Task.due_at == due_at, _open_due(Task))
+            )).first()
+        else:
+            row = (await session.execute(
+                select(CommonTask.task_text)
+                .where(CommonTask.id == task_id, CommonTask.due_at == due_at, _open_due(CommonTask))
+            )).first()
+        if row is None:
+            return None
+
+        res = await session.execute(
+            upsert_insert(ReminderSent)
+            .values(kind=kind, task_id=task_id, reminder=reminder, due_at=due_at, sent_at=datetime.utcnow())
+            .on_conflict_do_nothing()
+            .returning(ReminderSent.id)
+        )
+        if res.scalar_one_or_none() is None:
+            return None
+
+        if kind == KIND_TASK:
+            return row.task_text, [int(row.telegram_id)] if row.telegram_id else []
+
+        # общая задача: всем зарегистрированным, кто ещё не закрыл её у себя
+        res = await session.execute(
+            select(User.telegram_id)
+            .outerjoin(
+                CommonProgress,
+                and_(CommonProgress.task_id == task_id, CommonProgress.user_id == User.id),
+            )
+            .where(or_(CommonProgress.id.is_(None), CommonProgress.status != STATUS_DONE))
+        )
+        return row.task_text, [int(tid) for tid in res.scalars().all()]
+
+
+async def reminders_sent_cleanup(before: datetime) -> int:
+    """
+    Удаляем записи о напоминаниях по срокам раньше before (они больше не понадобятся).
+    """
+    async with unit_of_work() as session:
+        res = await session.execute(delete(ReminderSent).where(ReminderSent.due_at < before))
+        return int(res.rowcount or 0)
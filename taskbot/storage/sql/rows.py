@@ -0,0 +1,38 @@
+# taskbot/storage/sql/rows.py
+# Строка задачи для UI — собирается прямо из строки SELECT (Core), без ORM-объектов и dict
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+
+
+@dataclass(slots=True)
+class TaskRow:
+    task_id: str
+    task: str
+    from_name: str
+    due_str: str
+    status: str
+    created_at: str
+
+
+def due_to_str(due_at: datetime | None) -> str:
+    if not due_at:
+        return ""
+    return due_at.strftime("%Y-%m-%d %H:%M")
+
+
+def task_row(r) -> TaskRow:
+    """
+    Строка SELECT с колонками id, task_text, from_name, due_at, status, created_at -> TaskRow.
+    Подходит и для tasks, и для common_tasks (колонки называются одинаково).
+    """
+    return TaskRow(
+        str(r.id),
+        r.task_text,
+        r.from_name,
+        due_to_str(r.due_at),
+        r.status,
+        r.created_at.isoformat() + "Z",
+    )
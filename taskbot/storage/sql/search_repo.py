@@ -0,0 +1,96 @@
+# taskbot/storage/sql/search_repo.py
+# Полнотекстовый поиск по личным и общим задачам
+
+from __future__ import annotations
+
+from sqlalchemy import select, literal, literal_column, union_all, func
+from taskbot.config import STATUS_ARCHIVE, TASKS_PAGE_SIZE, COMMON_SHEET, IS_SQLITE
+from taskbot.storage.sql.db import read_session
+from taskbot.storage.sql.models import Task, CommonTask, User
+from taskbot.storage.sql.common_repo import common_for_user_query
+from taskbot.storage.sql.paging import Page
+from taskbot.storage.sql.rows import TaskRow, task_row
+
+
+def _tsquery(query: str):
+    """
+    websearch_to_tsquery понимает "фраза в кавычках", OR и -исключение и не падает на мусоре.
+    Запрос строим в тех же двух конфигурациях, что и search_vector (см. models.SEARCH_VECTOR_SQL).
+    """
+    ru = func.websearch_to_tsquery(literal_column("'russian'::regconfig"), query)
+    simple = func.websearch_to_tsquery(literal_column("'simple'::regconfig"), query)
+    return ru.op("||")(simple)
+
+
+def _match(model, query: str, tsq):
+    """
+    (условие, ранг). SQLite: tsvector нет — подстрока без учёта регистра (только латиница), ранг 0.
+    """
+    if IS_SQLITE:
+        return model.task_text.icontains(query, autoescape=True), literal(0.0)
+    return model.search_vector.op("@@")(tsq), func.ts_rank(model.search_vector, tsq)
+
+
+def _search_item(r) -> tuple[TaskRow, bool, str]:
+    return task_row(r), bool(r.kind), r.owner
+
+
+async def search_tasks(
+    query: str,
+    user_id: int | None = None,
+    offset: int = 0,
+    limit: int = TASKS_PAGE_SIZE,
+) -> Page:
+    """
+    Поиск одним запросом (UNION ALL личных и общих), сортировка по рангу.
+    user_id задан — только его личные задачи + общие со статусом "для него";
+    None (админ) — задачи всех пользователей (владелец — текущее имя) и общие как есть.
+    ARCHIVE не ищем. Ранг не даёт стабильного keyset-ключа, поэтому листаем по offset
+    (глубоко по результатам поиска не ходят). rows: [(TaskRow, is_common, владелец)].
+    """
+    query = (query or "").strip()
+    if not query:
+        return Page()
+
+    tsq = None if IS_SQLITE else _tsquery(query)
+    task_match, task_rank = _match(Task, query, tsq)
+    common_match, common_rank = _match(CommonTask, query, tsq)
+
+    personal = (
+        select(Task.id, Task.task_text, Task.from_name, Task.due_at, Task.status, Task.created_at)
+        .where(task_match, Task.status != STATUS_ARCHIVE)
+    )
+
+    if user_id is None:
+        personal = personal.outerjoin(User, User.id == Task.user_id).add_columns(
+            literal(0).label("kind"), func.coalesce(User.name, Task.assignee_name).label("owner"), task_rank.label("rank"),
+        )
+        common = select(
+            CommonTask.id,
+            CommonTask.task_text,
+            CommonTask.from_name,
+            CommonTask.due_at,
+            CommonTask.status,
+            CommonTask.created_at,
+        ).where(CommonTask.status != STATUS_ARCHIVE)
+    else:
+        personal = personal.where(Task.user_id == user_id).add_columns(
+            literal(0).label("kind"), Task.assignee_name.label("owner"), task_rank.label("rank"),
+        )
+        common = common_for_user_query(user_id, "all")
+
+    common = common.add_columns(
+        literal(1).label("kind"), literal(COMMON_SHEET).label("owner"), common_rank.label("rank"),
+    ).where(common_match)
+
+    u = union_all(personal, common).subquery()
+    q = select(u).order_by(u.c.rank.desc(), u.c.kind, u.c.id.desc()).offset(offset).limit(limit + 1)
+
+    async with read_session() as session:
+        rows = (await session.execute(q)).all()
+
+    return Page(
+        rows=[_search_item(r) for r in rows[:limit]],
+        has_prev=offset > 0,
+        has_next=len(rows) > limit,
+    )
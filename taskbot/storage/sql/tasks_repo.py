@@ -5,11 +5,15 @@ from __future__ import annotations
 
 import json
 from datetime import datetime
-from sqlalchemy import select, update, delete
-from taskbot.config import STATUS_TODO, STATUS_DONE, STATUS_ARCHIVE
-from taskbot.storage.sql.db import SessionLocal
-from taskbot.storage.sql.models import Task
-from taskbot.storage.sql.outbox import outbox_add
+from sqlalchemy import select, insert, update, delete, literal, union_all, and_, or_, true, false, func
+from taskbot.config import STATUS_TODO, STATUS_DONE, STATUS_ARCHIVE, TASKS_PAGE_SIZE, COMMON_SHEET, IS_SQLITE
+from taskbot.storage.sql.db import read_session, unit_of_work, db_now
+from taskbot.storage.sql.models import Task, User, CommonTask, CommonProgress, UserTaskCounter
+from taskbot.storage.sql.counters import COMMON_COUNTER_KEY, CounterDelta, TaskCounters, bump
+from taskbot.storage.sql.outbox import outbox_add, outbox_add_many
+from taskbot.storage.sql.paging import Page, fetch_page
+from taskbot.storage.sql.common_repo import common_for_user_query
+from taskbot.storage.sql.rows import TaskRow, task_row, due_to_str as _due_to_str
 
 
 def _parse_due_str(due_str: str | None) -> datetime | None:
@@ -27,107 +31,357 @@ def _parse_due_str(due_str: str | None) -> datetime | None:
         return None
 
 
-def _due_to_str(due_at: datetime | None) -> str:
-    if not due_at:
-        return ""
-    return due_at.strftime("%Y-%m-%d %H:%M")
+def _owner(user_id: int | None, sheet: str = COMMON_SHEET):
+    """
+    Фильтр владельца: задачи пользователя по user_id; None — задачи вкладки sheet без пользователя:
+    лист "Общие" (задачи на "📌 Общие" через /newtask) или вкладка незарегистрированного/удалённого
+    пользователя (по индексу ix_tasks_assignee_name).
+    """
+    if user_id is None:
+        return and_(Task.user_id.is_(None), Task.assignee_name == sheet)
+    return Task.user_id == user_id
 
 
-async def task_create(assignee_name: str, task_text: str, from_name: str, due_str: str, status: str, created_at: str) -> int:
+async def tasks_unowned_sheets() -> list[str]:
+    """
+    Вкладки с задачами без пользователя (кроме "Общие") — для админ-просмотра:
+    задачи незарегистрированных и удалённых пользователей.
+    """
+    q = (
+        select(Task.assignee_name)
+        .where(Task.user_id.is_(None), Task.assignee_name != COMMON_SHEET)
+        .distinct()
+        .order_by(Task.assignee_name)
+    )
+    async with read_session() as session:
+        return list((await session.execute(q)).scalars().all())
+
+
+async def task_create(
+    user_id: int | None,
+    assignee_name: str,
+    task_text: str,
+    from_name: str,
+    due_str: str,
+    status: str,
+    created_at: str,
+) -> int:
     """
     Создаём задачу. Возвращаем порядковый id (task_id).
+    assignee_name — вкладка в Google (имя пользователя или "Общие").
     created_at игнорируем как строку — записываем норм datetime.
+    Задача и событие TASK_CREATED пишутся одной транзакцией (id берём из RETURNING).
     """
     due_at = _parse_due_str(due_str)
 
-    async with SessionLocal() as session:
-        t = Task(
-            assignee_name=assignee_name,
-            task_text=task_text,
-            from_name=from_name,
-            due_at=due_at,
-            status=status or STATUS_TODO,
-            created_at=datetime.utcnow(),
+    async with unit_of_work() as session:
+        res = await session.execute(
+            insert(Task)
+            .values(
+                user_id=user_id,
+                assignee_name=assignee_name,
+                task_text=task_text,
+                from_name=from_name,
+                due_at=due_at,
+                status=status or STATUS_TODO,
+                created_at=datetime.utcnow(),
+            )
+            .returning(Task.id)
         )
-        session.add(t)
-        await session.commit()
-        await session.refresh(t)
-        task_id = int(t.id)
-
-    await outbox_add("TASK_CREATED", {
-        "sheet": assignee_name,
-        "task_id": task_id,
-        "task": task_text,
-        "from_name": from_name,
-        "due": _due_to_str(due_at),
-        "status": status or STATUS_TODO,
-    })
+        task_id = int(res.scalar_one())
+        await bump(session, user_id, None, status or STATUS_TODO)
+
+        await outbox_add("TASK_CREATED", {
+            "sheet": assignee_name,
+            "task_id": task_id,
+            "task": task_text,
+            "from_name": from_name,
+            "due": _due_to_str(due_at),
+            "status": status or STATUS_TODO,
+        }, session=session)
     return task_id
 
 
-async def tasks_list(assignee_name: str) -> list[dict]:
+# строк в одном multi-row INSERT: 7 колонок * 4000 = 28000 < лимита 32767 параметров asyncpg
+_IMPORT_CHUNK = 4000
+
+
+async def tasks_import(items: list[tuple[str, str, str, str]]) -> int:
     """
-    Возвращаем список задач как dict (потом мапим на TaskRow в tasks.py)
+    Массовое создание задач (админский /import) — то же, что task_create в диалоге /newtask:
+    items: [(assignee_name, task_text, from_name, due_str), ...];
+    строки привязываются к пользователю по имени (один SELECT на весь файл),
+    COMMON_SHEET — задача листа "Общие" без пользователя.
+    Всё одной транзакцией: multi-row INSERT ... RETURNING пачками
+    и один пакетный INSERT событий TASK_CREATED.
+    Возвращаем число созданных задач.
     """
-    async with SessionLocal() as session:
-        res = await session.execute(
-            select(Task).where(Task.assignee_name == assignee_name).order_by(Task.id.desc())
+    now = datetime.utcnow()
+    rows = [
+        {
+            "assignee_name": assignee_name,
+            "task_text": task_text,
+            "from_name": from_name,
+            "due_at": _parse_due_str(due_str),
+            "status": STATUS_TODO,
+            "created_at": now,
+        }
+        for assignee_name, task_text, from_name, due_str in items
+    ]
+
+    events: list[tuple[str, dict]] = []
+    delta = CounterDelta()
+    async with unit_of_work() as session:
+        names = {r["assignee_name"] for r in rows} - {COMMON_SHEET}
+        user_ids = dict((await session.execute(select(User.name, User.id).where(User.name.in_(names)))).all()) if names else {}
+        for r in rows:
+            r["user_id"] = user_ids.get(r["assignee_name"])
+
+        for i in range(0, len(rows), _IMPORT_CHUNK):
+            res = await session.execute(
+                insert(Task)
+                .values(rows[i:i + _IMPORT_CHUNK])
+                .returning(Task.id, Task.assignee_name, Task.task_text, Task.from_name, Task.due_at, Task.status)
+            )
+            events.extend(
+                ("TASK_CREATED", {
+                    "sheet": r.assignee_name,
+                    "task_id": int(r.id),
+                    "task": r.task_text,
+                    "from_name": r.from_name,
+                    "due": _due_to_str(r.due_at),
+                    "status": r.status,
+                })
+                for r in res
+            )
+
+        for r in rows:
+            delta.move(r["user_id"], None, STATUS_TODO)
+        await delta.apply(session)
+
+        await outbox_add_many(events, session=session)
+    return len(events)
+
+
+def _is_open():
+    """
+    Открытая задача = не DONE и не ARCHIVE.
+    Статусы рендерим литералами, чтобы планировщик сопоставил условие
+    с частичным индексом ix_tasks_open_user_due.
+    """
+    return Task.status.not_in([
+        literal(STATUS_DONE, literal_execute=True),
+        literal(STATUS_ARCHIVE, literal_execute=True),
+    ])
+
+
+def _mode_filter(q, mode: str):
+    """
+    Фильтр режима просмотра:
+    my — открытые, overdue — открытые с прошедшим сроком, done — DONE, all — всё кроме ARCHIVE.
+    """
+    if mode == "my":
+        return q.where(_is_open())
+    if mode == "overdue":
+        return q.where(_is_open(), Task.due_at.is_not(None), Task.due_at < db_now())
+    if mode == "done":
+        return q.where(Task.status == STATUS_DONE)
+    return q.where(Task.status != STATUS_ARCHIVE)
+
+
+def _task_columns():
+    """
+    Только колонки, нужные для TaskRow: без ORM-гидрации (identity map, состояние объекта).
+    """
+    return select(Task.id, Task.task_text, Task.from_name, Task.due_at, Task.status, Task.created_at)
+
+
+async def tasks_list(user_id: int | None, mode: str = "all", sheet: str = COMMON_SHEET) -> list[TaskRow]:
+    """
+    Список задач пользователя сразу в TaskRow (Core SELECT колонок).
+    Фильтр режима (my/overdue/done/all) и сортировка по сроку — в SQL.
+    """
+    q = _task_columns().where(_owner(user_id, sheet))
+    q = _mode_filter(q, mode).order_by(Task.due_at.asc().nulls_last(), Task.id.desc())
+
+    async with read_session() as session:
+        res = await session.execute(q)
+        return [task_row(r) for r in res]
+
+
+def _page_item(r) -> tuple[TaskRow, bool]:
+    return task_row(r), bool(r.kind)
+
+
+async def tasks_page(
+    user_id: int | None,
+    mode: str,
+    cursor: str | None = None,
+    direction: str = "n",
+    limit: int = TASKS_PAGE_SIZE,
+    sheet: str = COMMON_SHEET,
+) -> Page:
+    """
+    Одна страница личных задач пользователя (keyset по (due_at, id)), для админ-просмотра.
+    user_id None — задачи вкладки sheet без пользователя (по умолчанию лист "Общие").
+    """
+    q = _task_columns().add_columns(literal(0).label("kind")).where(_owner(user_id, sheet))
+    q = _mode_filter(q, mode).subquery()
+
+    async with read_session() as session:
+        return await fetch_page(
+            session, select(q), q.c.due_at, q.c.kind, q.c.id,
+            cursor, direction, limit, _page_item,
+        )
+
+
+async def tasks_page_for_user(
+    user_id: int,
+    mode: str,
+    cursor: str | None = None,
+    direction: str = "n",
+    limit: int = TASKS_PAGE_SIZE,
+) -> Page:
+    """
+    Одна страница "личные + общие" для пользователя одним запросом (UNION ALL),
+    keyset по (due_at, kind, id): kind=0 личная, kind=1 общая.
+    """
+    personal = _task_columns().add_columns(literal(0).label("kind")).where(Task.user_id == user_id)
+    personal = _mode_filter(personal, mode)
+
+    common = common_for_user_query(user_id, mode).add_columns(literal(1).label("kind"))
+
+    u = union_all(personal, common).subquery()
+
+    async with read_session() as session:
+        return await fetch_page(
+            session, select(u), u.c.due_at, u.c.kind, u.c.id,
+            cursor, direction, limit, _page_item,
+        )
+
+
+async def team_overdue() -> dict[str, list[tuple[TaskRow, bool]]]:
+    """
+    Просрочка по всей команде одним запросом (UNION ALL):
+    - личные открытые задачи с due_at < now по каждому зарегистрированному пользователю;
+    - общие открытые задачи с due_at < now, которые пользователь ещё не закрыл.
+    Возвращаем {имя: [(TaskRow, is_common)]}, имена по алфавиту.
+    """
+    now = db_now()
+
+    personal = (
+        select(
+            User.name.label("user_name"),
+            false().label("is_common"),
+            Task.id,
+            Task.task_text,
+            Task.from_name,
+            Task.due_at,
+            Task.status,
+            Task.created_at,
+        )
+        .join(Task, Task.user_id == User.id)
+        .where(_is_open(), Task.due_at.is_not(None), Task.due_at < now)
+    )
+
+    common = (
+        select(
+            User.name.label("user_name"),
+            true().label("is_common"),
+            CommonTask.id,
+            CommonTask.task_text,
+            CommonTask.from_name,
+            CommonTask.due_at,
+            CommonTask.status,
+            CommonTask.created_at,
         )
-        rows = res.scalars().all()
-
-    out: list[dict] = []
-    for t in rows:
-        out.append({
-            "task_id": str(t.id),
-            "task": t.task_text,
-            "from_name": t.from_name,
-            "due_str": _due_to_str(t.due_at),
-            "status": t.status,
-            "created_at": t.created_at.isoformat() + "Z",
-        })
+        .select_from(User)
+        .join(CommonTask, true())
+        .outerjoin(
+            CommonProgress,
+            and_(CommonProgress.task_id == CommonTask.id, CommonProgress.user_id == User.id),
+        )
+        .where(
+            CommonTask.status.not_in([STATUS_DONE, STATUS_ARCHIVE]),
+            CommonTask.due_at.is_not(None),
+            CommonTask.due_at < now,
+            or_(CommonProgress.id.is_(None), CommonProgress.status != STATUS_DONE),
+        )
+    )
+
+    u = union_all(personal, common).subquery()
+    q = select(u).order_by(u.c.user_name, u.c.is_common, u.c.due_at, u.c.id)
+
+    async with read_session() as session:
+        res = await session.execute(q)
+        out: dict[str, list[tuple[TaskRow, bool]]] = {}
+        for r in res:
+            out.setdefault(r.user_name, []).append((task_row(r), bool(r.is_common)))
     return out
 
 
-async def task_set_status(assignee_name: str, task_id: str, status: str) -> bool:
+async def task_set_status(user_id: int | None, task_id: str, status: str, sheet: str = COMMON_SHEET) -> bool:
     """
-    Меняем статус по id.
+    Меняем статус по id одним UPDATE ... RETURNING (возвращает прежний статус для счётчиков
+    и вкладку задачи для зеркала). "Не найдено" = RETURNING не вернул строку.
     """
     try:
         tid = int(task_id)
     except ValueError:
         return False
 
-    async with SessionLocal() as session:
-        res = await session.execute(select(Task).where(Task.assignee_name == assignee_name, Task.id == tid))
-        t = res.scalar_one_or_none()
-        if not t:
-            return False
-        t.status = status
-        await session.commit()
-
-    await outbox_add("TASK_STATUS", {"sheet": assignee_name, "task_id": tid, "status": status})
+    async with unit_of_work() as session:
+        if IS_SQLITE:
+            # RETURNING в SQLite видит только новую строку; запись и так одна (single-writer)
+            row = (await session.execute(
+                select(Task.status, Task.assignee_name).where(_owner(user_id, sheet), Task.id == tid)
+            )).first()
+            if row is None:
+                return False
+            await session.execute(update(Task).where(Task.id == tid).values(status=status))
+        else:
+            # старый статус нужен для счётчиков: берём его в том же UPDATE (строка блокируется FOR UPDATE)
+            old = (
+                select(Task.id, Task.status)
+                .where(_owner(user_id, sheet), Task.id == tid)
+                .with_for_update()
+                .subquery()
+            )
+            res = await session.execute(
+                update(Task)
+                .where(Task.id == old.c.id)
+                .values(status=status)
+                .returning(old.c.status, Task.assignee_name)
+            )
+            row = res.first()
+            if row is None:
+                return False
+        await bump(session, user_id, row.status, status)
+        await outbox_add("TASK_STATUS", {"sheet": row.assignee_name, "task_id": tid, "status": status}, session=session)
     return True
 
 
-async def task_update_text(assignee_name: str, task_id: str, new_text: str) -> bool:
+async def task_update_text(user_id: int | None, task_id: str, new_text: str, sheet: str = COMMON_SHEET) -> bool:
     try:
         tid = int(task_id)
     except ValueError:
         return False
 
-    async with SessionLocal() as session:
-        res = await session.execute(select(Task).where(Task.assignee_name == assignee_name, Task.id == tid))
-        t = res.scalar_one_or_none()
-        if not t:
+    async with unit_of_work() as session:
+        res = await session.execute(
+            update(Task)
+            .where(_owner(user_id, sheet), Task.id == tid)
+            .values(task_text=new_text)
+            .returning(Task.assignee_name)
+        )
+        sheet = res.scalar_one_or_none()
+        if sheet is None:
             return False
-        t.task_text = new_text
-        await session.commit()
-
-    await outbox_add("TASK_TEXT", {"sheet": assignee_name, "task_id": tid, "task": new_text})
+        await outbox_add("TASK_TEXT", {"sheet": sheet, "task_id": tid, "task": new_text}, session=session)
     return True
 
 
-async def task_update_due(assignee_name: str, task_id: str, due_str: str) -> bool:
+async def task_update_due(user_id: int | None, task_id: str, due_str: str, sheet: str = COMMON_SHEET) -> bool:
     try:
         tid = int(task_id)
     except ValueError:
@@ -135,53 +389,157 @@ async def task_update_due(assignee_name: str, task_id: str, due_str: str) -> boo
 
     due_at = _parse_due_str(due_str)
 
-    async with SessionLocal() as session:
-        res = await session.execute(select(Task).where(Task.assignee_name == assignee_name, Task.id == tid))
-        t = res.scalar_one_or_none()
-        if not t:
+    async with unit_of_work() as session:
+        res = await session.execute(
+            update(Task)
+            .where(_owner(user_id, sheet), Task.id == tid)
+            .values(due_at=due_at)
+            .returning(Task.assignee_name)
+        )
+        sheet = res.scalar_one_or_none()
+        if sheet is None:
             return False
-        t.due_at = due_at
-        await session.commit()
-
-    await outbox_add("TASK_DUE", {"sheet": assignee_name, "task_id": tid, "due": _due_to_str(due_at)})
+        await outbox_add("TASK_DUE", {"sheet": sheet, "task_id": tid, "due": _due_to_str(due_at)}, session=session)
     return True
 
 
-async def task_delete(assignee_name: str, task_id: str) -> bool:
+async def task_delete(user_id: int | None, task_id: str, sheet: str = COMMON_SHEET) -> bool:
     try:
         tid = int(task_id)
     except ValueError:
         return False
 
-    async with SessionLocal() as session:
-        res = await session.execute(select(Task).where(Task.assignee_name == assignee_name, Task.id == tid))
-        t = res.scalar_one_or_none()
-        if not t:
+    async with unit_of_work() as session:
+        res = await session.execute(
+            delete(Task)
+            .where(_owner(user_id, sheet), Task.id == tid)
+            .returning(Task.status, Task.assignee_name)
+        )
+        row = res.first()
+        if row is None:
             return False
-        await session.execute(delete(Task).where(Task.assignee_name == assignee_name, Task.id == tid))
-        await session.commit()
-
-    await outbox_add("TASK_DELETE", {"sheet": assignee_name, "task_id": tid})
+        await bump(session, user_id, row.status, None)
+        await outbox_add("TASK_DELETE", {"sheet": row.assignee_name, "task_id": tid}, session=session)
     return True
 
 
 async def archive_done_before(cutoff: datetime) -> int:
     """
     В начале месяца: DONE с due_at < cutoff -> ARCHIVE.
+    Один UPDATE ... RETURNING и один пакетный INSERT событий TASK_STATUS
+    (по событию на задачу — чтобы архив дошёл до зеркала), всё в одной транзакции.
     """
-    async with SessionLocal() as session:
-        res = await session.execute(select(Task).where(Task.status == STATUS_DONE, Task.due_at.is_not(None), Task.due_at < cutoff))
-        tasks = res.scalars().all()
-        if not tasks:
+    async with unit_of_work() as session:
+        res = await session.execute(
+            update(Task)
+            .where(Task.status == STATUS_DONE, Task.due_at.is_not(None), Task.due_at < cutoff)
+            .values(status=STATUS_ARCHIVE)
+            .returning(Task.id, Task.assignee_name, Task.user_id)
+            .execution_options(synchronize_session=False)
+        )
+        rows = res.all()
+        if not rows:
             return 0
 
-        for t in tasks:
-            t.status = STATUS_ARCHIVE
-        await session.commit()
+        delta = CounterDelta()
+        for _tid, _sheet, user_id in rows:
+            delta.move(user_id, STATUS_DONE, STATUS_ARCHIVE)
+        await delta.apply(session)
+
+        await outbox_add_many([
+            ("TASK_STATUS", {"sheet": sheet, "task_id": int(tid), "status": STATUS_ARCHIVE})
+            for tid, sheet, _user_id in rows
+        ], session=session)
+    return len(rows)
+
+
+async def task_counters(user_id: int) -> TaskCounters:
+    """
+    Сводка для пользователя (личные + общие) одним запросом:
+    open/done — из user_task_counters (две строки по PK: пользователь и COMMON_COUNTER_KEY),
+    overdue — COUNT по частичному индексу открытых задач (due_at < now) + просроченные общие.
+    """
+    def counter(col, key: int):
+        return func.coalesce(select(col).where(UserTaskCounter.user_id == key).scalar_subquery(), 0)
+
+    overdue_personal = (
+        select(func.count())
+        .select_from(Task)
+        .where(Task.user_id == user_id, _is_open(), Task.due_at.is_not(None), Task.due_at < db_now())
+        .scalar_subquery()
+    )
+    overdue_common = select(func.count()).select_from(common_for_user_query(user_id, "overdue").subquery()).scalar_subquery()
+
+    q = select(
+        counter(UserTaskCounter.open_count, user_id).label("p_open"),
+        counter(UserTaskCounter.done_count, user_id).label("p_done"),
+        counter(UserTaskCounter.common_done_count, user_id).label("c_mine"),
+        counter(UserTaskCounter.open_count, COMMON_COUNTER_KEY).label("c_open"),
+        counter(UserTaskCounter.done_count, COMMON_COUNTER_KEY).label("c_done"),
+        overdue_personal.label("o_personal"),
+        overdue_common.label("o_common"),
+    )
+
+    async with read_session() as session:
+        r = (await session.execute(q)).one()
+
+    # общая задача "открыта для меня", если открыта сама и я её не закрыл
+    return TaskCounters(
+        open=r.p_open + r.c_open - r.c_mine,
+        overdue=r.o_personal + r.o_common,
+        done=r.p_done + r.c_done + r.c_mine,
+    )
+
+
+async def rebuild_counters(session, user_id: int | None = None) -> None:
+    """
+    Пересчитываем user_task_counters с нуля (db_init, импорт из Google).
+    user_id — только строку одного пользователя (его задачи заново привязались при регистрации).
+    session — AsyncSession или AsyncConnection внутри уже открытой транзакции.
+    Дальше счётчики поддерживаются дельтами в мутациях.
+    """
+    open_ = Task.status.not_in([STATUS_DONE, STATUS_ARCHIVE])
+    c_open = CommonTask.status.not_in([STATUS_DONE, STATUS_ARCHIVE])
+    cols = ["user_id", "open_count", "done_count", "common_done_count"]
+
+    personal = (
+        select(
+            Task.user_id,
+            func.count().filter(open_),
+            func.count().filter(Task.status == STATUS_DONE),
+            literal(0),
+        )
+        .where(Task.user_id.is_not(None))
+        .group_by(Task.user_id)
+    )
+    # закрытые пользователями открытые общие задачи
+    closed = (
+        select(CommonProgress.user_id, func.count().label("n"))
+        .join(CommonTask, CommonTask.id == CommonProgress.task_id)
+        .where(CommonProgress.status == STATUS_DONE, CommonProgress.user_id.is_not(None), c_open)
+        .group_by(CommonProgress.user_id)
+    )
+
+    if user_id is not None:
+        await session.execute(delete(UserTaskCounter).where(UserTaskCounter.user_id == user_id))
+        await session.execute(insert(UserTaskCounter).from_select(cols, personal.where(Task.user_id == user_id)))
+        closed = closed.where(CommonProgress.user_id == user_id)
+    else:
+        await session.execute(delete(UserTaskCounter))
+        await session.execute(insert(UserTaskCounter).from_select(cols, personal))
+        await session.execute(
+            insert(UserTaskCounter).from_select(
+                cols,
+                select(
+                    literal(COMMON_COUNTER_KEY),
+                    func.count().filter(c_open),
+                    func.count().filter(CommonTask.status == STATUS_DONE),
+                    literal(0),
+                ),
+            )
+        )
 
-    # в outbox кинем одно событие-обновление пачкой (проще воркеру)
-    await outbox_add("TASK_ARCHIVE_BATCH", {
-        "cutoff": cutoff.isoformat(),
-        "type": "personal",
-    })
-    return len(tasks)
+    delta = CounterDelta()
+    for uid, n in (await session.execute(closed)).all():
+        delta.add(uid, common_done=int(n))
+    await delta.apply(session)
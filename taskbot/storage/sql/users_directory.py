@@ -0,0 +1,91 @@
+# taskbot/storage/sql/users_directory.py
+# In-process справочник пользователей: name -> telegram_id, telegram_id -> (id, name), id -> name.
+# Сбрасывается при изменениях в users_repo и по NOTIFY от других реплик бота.
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+from sqlalchemy import select
+
+from taskbot.config import USERS_CACHE_TTL
+from taskbot.storage.sql.db import SessionLocal
+from taskbot.storage.sql.models import User
+from taskbot.storage.sql.notify import listen_forever
+
+# канал, в который users_repo шлёт NOTIFY после изменений пользователей
+USERS_CHANNEL = "taskbot_users"
+
+
+class UserDirectory:
+    """
+    Кеш таблицы users. Читается целиком одним запросом при первом обращении
+    после инвалидации (или по истечении TTL — страховка, если NOTIFY потерялся).
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self._ttl = ttl
+        self._by_name: dict[str, int] = {}
+        self._by_tid: dict[int, str] = {}
+        self._id_by_tid: dict[int, int] = {}
+        self._name_by_id: dict[int, str] = {}
+        self._loaded_at: float | None = None
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+        self._version += 1
+
+    def _is_fresh(self) -> bool:
+        if self._loaded_at is None:
+            return False
+        return self._ttl <= 0 or (time.monotonic() - self._loaded_at) < self._ttl
+
+    async def _ensure_loaded(self) -> None:
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if self._is_fresh():
+                return
+            version = self._version
+            async with SessionLocal() as session:
+                res = await session.execute(select(User.id, User.name, User.telegram_id))
+                rows = res.all()
+
+            self._by_name = {name: int(tid) for _id, name, tid in rows}
+            self._by_tid = {tid: name for name, tid in self._by_name.items()}
+            self._id_by_tid = {int(tid): int(uid) for uid, _name, tid in rows}
+            self._name_by_id = {int(uid): name for uid, name, _tid in rows}
+            # если пока читали пришла инвалидация — перечитаем при следующем обращении
+            self._loaded_at = time.monotonic() if version == self._version else None
+
+    async def name_to_tid(self) -> dict[str, int]:
+        await self._ensure_loaded()
+        return dict(self._by_name)
+
+    async def name_by_tid(self, telegram_id: int) -> str | None:
+        await self._ensure_loaded()
+        return self._by_tid.get(telegram_id)
+
+    async def tid_by_name(self, name: str) -> int | None:
+        await self._ensure_loaded()
+        return self._by_name.get(name)
+
+    async def id_by_tid(self, telegram_id: int) -> int | None:
+        await self._ensure_loaded()
+        return self._id_by_tid.get(telegram_id)
+
+    async def id_to_name(self) -> dict[int, str]:
+        await self._ensure_loaded()
+        return dict(self._name_by_id)
+
+    async def listen(self) -> None:
+        """
+        Слушаем NOTIFY от всех процессов (реплики бота, воркер) и сбрасываем кеш.
+        """
+        await listen_forever(USERS_CHANNEL, lambda _payload: self.invalidate(), self.invalidate)
+
+
+user_directory = UserDirectory(USERS_CACHE_TTL)
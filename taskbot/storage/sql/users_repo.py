@@ -3,46 +3,70 @@
 
 from __future__ import annotations
 
-from sqlalchemy import select, delete
-from taskbot.storage.sql.db import SessionLocal
-from taskbot.storage.sql.models import User
+from sqlalchemy import select, update, delete
+from taskbot.storage.sql.db import unit_of_work
+from taskbot.storage.sql.models import User, Task, CommonProgress, UserTaskCounter
+from taskbot.storage.sql.notify import notify
 from taskbot.storage.sql.outbox import outbox_add
+from taskbot.storage.sql.users_directory import user_directory, USERS_CHANNEL
+from taskbot.storage.sql.tasks_repo import rebuild_counters
+
+# Чтения идут из in-process справочника (user_directory), а не из таблицы.
+# Любая запись шлёт NOTIFY (доставится после COMMIT) и сбрасывает локальный кеш.
+# Задачи ссылаются на users.id: переименование меняет одну строку users,
+# удаление оставляет задачи без владельца (ON DELETE SET NULL) до повторной регистрации.
+
+
+async def link_user_tasks(session, user_id: int | None = None) -> None:
+    """
+    Привязываем задачи и прогресс без user_id к пользователям по имени вкладки
+    (переход со строковых имён, импорт из Google, повторная регистрация после /unregister).
+    user_id — только для одного пользователя. session — AsyncSession или AsyncConnection.
+    """
+    tasks = update(Task).where(Task.user_id.is_(None), Task.assignee_name == User.name).values(user_id=User.id)
+    progress = (
+        update(CommonProgress)
+        .where(CommonProgress.user_id.is_(None), CommonProgress.user_name == User.name)
+        .values(user_id=User.id)
+    )
+    if user_id is not None:
+        tasks = tasks.where(User.id == user_id)
+        progress = progress.where(User.id == user_id)
+    await session.execute(tasks.execution_options(synchronize_session=False))
+    await session.execute(progress.execution_options(synchronize_session=False))
 
 
 async def users_get_map() -> dict[str, int]:
-    async with SessionLocal() as session:
-        res = await session.execute(select(User))
-        users = res.scalars().all()
-        return {u.name: int(u.telegram_id) for u in users}
+    return await user_directory.name_to_tid()
+
+
+async def users_id_map() -> dict[int, str]:
+    """
+    {users.id: имя} — для клавиатур (в callback_data идёт id, а не имя).
+    """
+    return await user_directory.id_to_name()
 
 
 async def users_list() -> list[tuple[str, int]]:
-    async with SessionLocal() as session:
-        res = await session.execute(select(User))
-        users = res.scalars().all()
-        return [(u.name, int(u.telegram_id)) for u in users]
+    return list((await user_directory.name_to_tid()).items())
 
 
 async def users_get_by_telegram_id(telegram_id: int) -> str | None:
-    async with SessionLocal() as session:
-        res = await session.execute(select(User).where(User.telegram_id == telegram_id))
-        u = res.scalar_one_or_none()
-        return u.name if u else None
+    return await user_directory.name_by_tid(telegram_id)
 
 
 async def users_get_by_name(name: str) -> int | None:
-    async with SessionLocal() as session:
-        res = await session.execute(select(User).where(User.name == name))
-        u = res.scalar_one_or_none()
-        return int(u.telegram_id) if u else None
+    return await user_directory.tid_by_name(name)
 
 
 async def users_upsert(name: str, telegram_id: int) -> None:
     """
     Регистрируем пользователя. Если name существует -> обновляем tid.
-    Если tid существует -> обновляем name (но handlers это обычно запрещает).
+    Если tid существует -> обновляем name (но handlers это обычно запрещает) — задачи
+    ссылаются на id, поэтому меняется только строка users.
+    Новому пользователю сразу привязываем оставшиеся без владельца задачи с его именем.
     """
-    async with SessionLocal() as session:
+    async with unit_of_work() as session:
         res = await session.execute(select(User).where(User.telegram_id == telegram_id))
         u_by_tid = res.scalar_one_or_none()
 
@@ -54,37 +78,46 @@ async def users_upsert(name: str, telegram_id: int) -> None:
         elif u_by_name:
             u_by_name.telegram_id = telegram_id
         else:
-            session.add(User(name=name, telegram_id=telegram_id))
+            u = User(name=name, telegram_id=telegram_id)
+            session.add(u)
+            await session.flush()
+            await link_user_tasks(session, u.id)
+            await rebuild_counters(session, u.id)
 
-        await session.commit()
+        # зеркалим в Google (воркером) — в той же транзакции
+        await outbox_add("USER_UPSERT", {"name": name, "telegram_id": telegram_id}, session=session)
+        await notify(session, USERS_CHANNEL)
 
-    # зеркалим в Google (воркером)
-    await outbox_add("USER_UPSERT", {"name": name, "telegram_id": telegram_id})
+    user_directory.invalidate()
 
 
 async def users_delete_by_telegram_id(telegram_id: int) -> str | None:
-    async with SessionLocal() as session:
+    async with unit_of_work() as session:
         res = await session.execute(select(User).where(User.telegram_id == telegram_id))
         u = res.scalar_one_or_none()
         if not u:
             return None
         name = u.name
+        await session.execute(delete(UserTaskCounter).where(UserTaskCounter.user_id == u.id))
         await session.execute(delete(User).where(User.telegram_id == telegram_id))
-        await session.commit()
+        await outbox_add("USER_DELETE", {"name": name, "telegram_id": telegram_id}, session=session)
+        await notify(session, USERS_CHANNEL)
 
-    await outbox_add("USER_DELETE", {"name": name, "telegram_id": telegram_id})
+    user_directory.invalidate()
     return name
 
 
 async def users_delete_by_name(name: str) -> int | None:
-    async with SessionLocal() as session:
+    async with unit_of_work() as session:
         res = await session.execute(select(User).where(User.name == name))
         u = res.scalar_one_or_none()
         if not u:
             return None
         tid = int(u.telegram_id)
+        await session.execute(delete(UserTaskCounter).where(UserTaskCounter.user_id == u.id))
         await session.execute(delete(User).where(User.name == name))
-        await session.commit()
+        await outbox_add("USER_DELETE", {"name": name, "telegram_id": tid}, session=session)
+        await notify(session, USERS_CHANNEL)
 
-    await outbox_add("USER_DELETE", {"name": name, "telegram_id": tid})
+    user_directory.invalidate()
     return tid
@@ -1,50 +1,128 @@
 # taskbot/sync_worker.py
-# sync_worker: раз в минуту берёт outbox и применяет в Google Sheets пачкой.
+# sync_worker: просыпается по NOTIFY (или раз в SYNC_POLL_INTERVAL), берёт outbox и применяет в Google Sheets пачкой.
 
 from __future__ import annotations
 
 import asyncio
+import os
+import socket
+import time
 
-from taskbot.storage.sql.outbox import outbox_fetch_batch, outbox_mark_processed, outbox_mark_error
+from taskbot.config import SYNC_POLL_INTERVAL, SYNC_DEBOUNCE_SECONDS
+from taskbot.storage.sql.outbox import outbox_claim_batch, outbox_mark_processed, outbox_mark_errors, OUTBOX_CHANNEL
+from taskbot.storage.sql.notify import listen_forever
+from taskbot.storage.sql.db import pool_liveness_loop
+from taskbot.storage.sql.outbox_retention import outbox_retention
 from taskbot.storage.sql.users_repo import users_get_map
+from taskbot.storage.sql.users_directory import user_directory
 from taskbot.sheets.mirror_schema import ensure_base_structure
 from taskbot.sheets.mirror_apply import apply_events
+from taskbot.sheets.mirror_coalesce import coalesce_events
 
+# id воркера для аренды пачек outbox (несколько воркеров могут работать параллельно:
+# события одной задачи outbox_claim_batch отдаёт только одному воркеру и по порядку)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
 
-async def run_once() -> None:
-    # 1) Обеспечим базовую структуру листов (Users/Общие/Progress + листы людей)
+BATCH_LIMIT = 200
+
+# как часто воркер чистит старые события outbox и создаёт секции (сек)
+MAINTENANCE_INTERVAL = 24 * 60 * 60
+
+# листы, для которых структура уже проверена в этом процессе
+_ensured_sheets: set[str] | None = None
+
+
+async def _ensure_structure() -> None:
+    """
+    ensure_base_structure дорогой (несколько запросов к Google на лист),
+    поэтому зовём его только когда изменился состав пользователей.
+    """
+    global _ensured_sheets
+    # воркер не слушает NOTIFY пользователей, поэтому перечитываем справочник
+    user_directory.invalidate()
     users_map = await users_get_map()
-    await ensure_base_structure(list(users_map.keys()))
+    names = set(users_map.keys())
+    if names == _ensured_sheets:
+        return
+    await ensure_base_structure(list(names))
+    _ensured_sheets = names
+
+
+async def run_once() -> int:
+    """
+    Один прогон. Возвращаем размер забранной пачки.
+    """
+    # 1) Обеспечим базовую структуру листов (Users/Общие/Progress + листы людей) — до аренды:
+    #    если Google недоступен, пачка не зависнет под арендой без учёта попытки
+    await _ensure_structure()
 
-    # 2) Берём пачку outbox
-    batch = await outbox_fetch_batch(limit=200)
+    # 2) Забираем пачку outbox под аренду (FOR UPDATE SKIP LOCKED; задачу, чьи ранние события
+    #    сейчас у другого воркера, не трогаем)
+    batch = await outbox_claim_batch(WORKER_ID, limit=BATCH_LIMIT)
     if not batch:
-        return
+        return 0
 
-    # 3) Готовим формат для apply_events
-    events = [(e.id, e.event_type, e.payload_json) for e in batch]
+    # 3) Схлопываем цепочки событий по задаче в итоговый эффект
+    ops, noop_ids = coalesce_events([(e.id, e.event_type, e.payload) for e in batch])
 
-    # 4) Применяем
-    processed_ids: list[int] = []
-    for e in batch:
+    # 4) Применяем; успех/ошибка действия распространяется на все его исходные события
+    attempts = {e.id: e.attempts for e in batch}
+    processed_ids: list[int] = list(noop_ids)
+    failures: list[tuple[int, int, str]] = []
+    for op in ops:
         try:
-            await apply_events([(e.id, e.event_type, e.payload_json)])
-            processed_ids.append(e.id)
+            await apply_events([(op.source_ids[-1], op.event_type, op.payload)])
+            processed_ids.extend(op.source_ids)
         except Exception as ex:
-            await outbox_mark_error(e.id, str(ex))
+            failures.extend((eid, attempts.get(eid, 0), str(ex)) for eid in op.source_ids)
 
-    # 5) Отмечаем успешные
-    await outbox_mark_processed(processed_ids)
+    # 5) Отмечаем успешные и упавшие (только те, что всё ещё арендованы нами);
+    #    упавшие — одним UPDATE: попытка +1, backoff или dead-letter
+    await outbox_mark_processed(processed_ids, WORKER_ID)
+    await outbox_mark_errors(failures, WORKER_ID)
+    return len(batch)
 
 
 async def main_loop() -> None:
-    while True:
-        try:
-            await run_once()
-        except Exception as ex:
-            # чтобы воркер не умер
-            print("SYNC_WORKER ERROR:", ex)
-        await asyncio.sleep(60)
+    wakeup = asyncio.Event()
+    last_maintenance: float | None = None
+
+    # NOTIFY из outbox_add будит воркер; после (пере)подключения — тоже,
+    # чтобы забрать то, что пришло, пока соединения не было
+    listener = asyncio.create_task(
+        listen_forever(OUTBOX_CHANNEL, lambda _payload: wakeup.set(), wakeup.set)
+    )
+    pool_checker = asyncio.create_task(pool_liveness_loop())
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=SYNC_POLL_INTERVAL)
+                # короткое окно, чтобы собрать всплеск событий в одну пачку
+                await asyncio.sleep(SYNC_DEBOUNCE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+
+            try:
+                taken = await run_once()
+                if taken >= BATCH_LIMIT:
+                    # очередь не разобрана до конца — сразу следующий прогон
+                    wakeup.set()
+            except Exception as ex:
+                # чтобы воркер не умер
+                print("SYNC_WORKER ERROR:", ex)
+
+            # раз в сутки: секции на будущие месяцы + удаление старых обработанных
+            if last_maintenance is None or time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                last_maintenance = time.monotonic()
+                try:
+                    removed = await outbox_retention()
+                    print(f"OUTBOX RETENTION: removed {removed} events")
+                except Exception as ex:
+                    print("OUTBOX RETENTION ERROR:", ex)
+    finally:
+        listener.cancel()
+        pool_checker.cancel()
 
 
 if __name__ == "__main__":
@@ -15,3 +15,7 @@ class AdminTasksFSM(StatesGroup):
     choosing_view = State()
     editing_text = State()
     editing_due = State()
+
+
+class ImportFSM(StatesGroup):
+    waiting_file = State()
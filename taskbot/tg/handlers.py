@@ -2,18 +2,20 @@
 # Функционал:
 # - whitelist пользователей + админы
 # - регистрация /register (запрет повторной регистрации)
-# - админ-команды /registrations и /unregister <ID|Name>
+# - админ-команды /registrations, /unregister <ID|Name> и /dbpool (метрики пула БД)
+# - админ: /import — массовое создание задач из CSV/XLSX
 # - главное меню кнопками (постоянное)
 # - создание задач через диалог (с кнопками срока + назад)
 # - просмотр задач (/my /overdue /done /all) без период-фильтров
 # - /team_overdue
+# - поиск /search <запрос> (свои + общие), админ: /search_all <запрос> по всем
 # - DONE для личных и общих задач
 # - админ: просмотр задач пользователей + редакт/удалить/переключить статус (без подтверждений)
 # - ARCHIVE скрывается из /my /overdue /all (показывается только если захотите отдельно)
 
 from __future__ import annotations
 
-from datetime import date
+import html
 from typing import Optional, Tuple, List
 
 from aiogram import Dispatcher, Router, F, Bot
@@ -22,7 +24,8 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from taskbot.tg.fsm import NewTaskFSM, AdminTasksFSM
+from taskbot.tg.fsm import NewTaskFSM, AdminTasksFSM, ImportFSM
+from taskbot.tg.middlewares import IdentityMiddleware, DbSessionMiddleware
 from taskbot.tg.keyboards import (
     assignee_keyboard,
     due_date_keyboard,
@@ -35,13 +38,17 @@ from taskbot.tg.keyboards import (
     admin_view_keyboard,
     admin_task_actions_keyboard,
     admin_nav_keyboard,
+    tasks_pager_keyboard,
+    search_pager_keyboard,
+    COMMON_OWNER,
+    TAB_OWNER,
 )
 
 from taskbot.sheets.users import (
     users_get_map,
+    users_id_map,
     users_list,
     users_upsert,
-    users_get_by_telegram_id,
     users_get_by_name,
     users_delete_by_telegram_id,
     users_delete_by_name,
@@ -49,8 +56,15 @@ from taskbot.sheets.users import (
 
 from taskbot.sheets.tasks import (
     TaskRow,
+    TaskPage,
     task_append,
-    tasks_list,
+    tasks_import,
+    tasks_page,
+    tasks_page_for_user,
+    tasks_unowned_sheets,
+    team_overdue,
+    search_tasks,
+    task_counters,
     task_set_done,
     task_set_status,
     task_update_text,
@@ -60,30 +74,34 @@ from taskbot.sheets.tasks import (
 )
 
 from taskbot.sheets.common import (
-    common_tasks_for_user,
     common_progress_set_done,
 )
 
 from taskbot.utils.dates import (
     normalize_due_date,
-    is_overdue,
     today_iso,
     tomorrow_iso,
     end_of_week_iso,
 )
 
 from taskbot.utils.formatters import (
+    format_counters_line,
     format_task_line,
     chunk_text,
 )
 
+from taskbot.utils.task_import import parse_import_file
+
+from taskbot.storage.sql.db import pool_stats
+
 from taskbot.config import (
     COMMON_SHEET,
     STATUS_TODO,
     STATUS_DONE,
-    STATUS_ARCHIVE,
     ALLOWED_TELEGRAM_IDS,
     ADMIN_TELEGRAM_IDS,
+    IMPORT_MAX_ROWS,
+    TASKS_PAGE_SIZE,
 )
 
 router = Router()
@@ -133,11 +151,42 @@ async def send_with_menu(message: Message, text: str):
 
 # ---------- misc helpers ----------
 
-def get_my_sheet_name_or_none(telegram_id: int, users_map: dict[str, int]) -> Optional[str]:
-    for name, tid in users_map.items():
-        if tid == telegram_id:
-            return name
-    return None
+def _parse_owner(token: str) -> Tuple[bool, Optional[int]]:
+    """
+    Владелец задач из callback_data: (ok, users.id или None — лист "Общие").
+    ok=False — кнопка из старого сообщения (там было имя вкладки), такую не выполняем.
+    """
+    token = (token or "").strip()
+    if token == COMMON_OWNER:
+        return True, None
+    if token.isdigit():
+        return True, int(token)
+    return False, None
+
+
+async def _admin_owner(token: str, state: FSMContext) -> Tuple[bool, Optional[int], str]:
+    """
+    Владелец задачи из кнопки админ-просмотра: (ok, users.id или None, вкладка задач без пользователя).
+    "tab" — вкладка без пользователя, выбранная в админ-просмотре (имя лежит в FSM).
+    """
+    if token.strip() == TAB_OWNER:
+        data = await state.get_data()
+        sheet = data.get("admin_sheet")
+        if "admin_user_id" not in data or data["admin_user_id"] is not None or not sheet:
+            return False, None, COMMON_SHEET
+        return True, None, sheet
+    ok, user_id = _parse_owner(token)
+    return ok, user_id, COMMON_SHEET
+
+
+async def _admin_users_markup(state: FSMContext):
+    """
+    Выбор пользователя в админ-просмотре: зарегистрированные + вкладки с задачами без пользователя
+    (незарегистрированные и удалённые) — их список кладём в FSM, в кнопке только индекс.
+    """
+    tabs = await tasks_unowned_sheets()
+    await state.update_data(admin_tabs=tabs)
+    return admin_users_keyboard(await users_id_map(), tabs)
 
 
 def _parse_unregister_target(arg: str) -> Tuple[Optional[int], Optional[str]]:
@@ -152,18 +201,22 @@ def _parse_unregister_target(arg: str) -> Tuple[Optional[int], Optional[str]]:
 # ---------- commands ----------
 
 @router.message(Command("start"))
-async def cmd_start(message: Message):
-    await message.answer(
-        "Привет! Я бот задач.\n\n"
-        "Если у тебя есть доступ, зарегистрируйся:\n"
-        "/register <ИмяВкладки>\n\n"
-        "Можно работать через меню кнопками 👇",
-        reply_markup=main_menu_keyboard(is_admin(message.from_user.id)),
-    )
+async def cmd_start(message: Message, my_name: Optional[str] = None, my_user_id: Optional[int] = None):
+    if my_name and my_user_id:
+        c = await task_counters(my_user_id)
+        text = f"Привет, {my_name}!\n\n{format_counters_line(c.open, c.overdue, c.done)}\n\nМожно работать через меню кнопками 👇"
+    else:
+        text = (
+            "Привет! Я бот задач.\n\n"
+            "Если у тебя есть доступ, зарегистрируйся:\n"
+            "/register <ИмяВкладки>\n\n"
+            "Можно работать через меню кнопками 👇"
+        )
+    await message.answer(text, reply_markup=main_menu_keyboard(is_admin(message.from_user.id)))
 
 
 @router.message(Command("register"))
-async def cmd_register(message: Message):
+async def cmd_register(message: Message, my_name: Optional[str] = None):
     if await deny_if_not_allowed(message):
         return
 
@@ -176,7 +229,7 @@ async def cmd_register(message: Message):
 
     sheet_name = parts[1].strip()
 
-    existing_name = await users_get_by_telegram_id(telegram_id)
+    existing_name = my_name
     if existing_name is not None:
         await send_with_menu(
             message,
@@ -216,6 +269,106 @@ async def cmd_registrations(message: Message):
         await send_with_menu(message, part)
 
 
+@router.message(Command("dbpool"))
+async def cmd_dbpool(message: Message):
+    if await deny_if_not_allowed(message):
+        return
+    if await deny_if_not_admin(message):
+        return
+
+    text = "Пул соединений БД:\n" + "\n".join(f"{k}: {v}" for k, v in pool_stats().items())
+    replica = pool_stats(replica=True)
+    if replica:
+        text += "\n\nРеплика чтения:\n" + "\n".join(f"{k}: {v}" for k, v in replica.items())
+    await send_with_menu(message, text)
+
+
+@router.message(Command("import"))
+async def cmd_import(message: Message, state: FSMContext):
+    if await deny_if_not_allowed(message):
+        return
+    if await deny_if_not_admin(message):
+        return
+
+    await state.set_state(ImportFSM.waiting_file)
+    await send_with_menu(
+        message,
+        "Пришли файл CSV или XLSX с задачами.\n"
+        "Первая строка — заголовки: assignee, task, due, from (due и from необязательны).\n"
+        f"Исполнитель — имя зарегистрированного пользователя или «{COMMON_SHEET}». "
+        f"Максимум {IMPORT_MAX_ROWS} строк.",
+    )
+
+
+@router.message(ImportFSM.waiting_file, F.document)
+async def import_file(message: Message, state: FSMContext, bot: Bot):
+    if await deny_if_not_allowed(message):
+        return
+    if await deny_if_not_admin(message):
+        return
+
+    # любой исход ниже завершает импорт: админ не остаётся в ожидании файла без ответа
+    await state.clear()
+
+    filename = message.document.file_name or ""
+    if not filename.lower().endswith((".csv", ".xlsx")):
+        await send_with_menu(message, "Нужен файл .csv или .xlsx. Начни заново: /import")
+        return
+
+    try:
+        data = (await bot.download(message.document)).read()
+    except Exception as ex:
+        await send_with_menu(message, f"Не смог скачать файл: {html.escape(str(ex))}\nНачни заново: /import")
+        return
+
+    users_map = await users_get_map()
+    try:
+        rows, errors = parse_import_file(
+            filename,
+            data,
+            known_assignees=set(users_map.keys()) | {COMMON_SHEET},
+            default_from=message.from_user.full_name,
+            max_rows=IMPORT_MAX_ROWS,
+        )
+    except ImportError:
+        await send_with_menu(message, "Для XLSX на сервере не установлен openpyxl. Пришли CSV: /import")
+        return
+    except Exception as ex:
+        await send_with_menu(message, f"Не смог прочитать файл: {html.escape(str(ex))}\nНачни заново: /import")
+        return
+
+    # всё или ничего: с ошибками ничего не создаём, чтобы повторный импорт не дал дублей
+    if errors:
+        lines = ["Импорт не выполнен, исправь файл и начни заново: /import"] + [html.escape(e) for e in errors]
+        for part in chunk_text(lines):
+            await send_with_menu(message, part)
+        return
+    if not rows:
+        await send_with_menu(message, "В файле нет задач.")
+        return
+
+    try:
+        created = await tasks_import([(r.assignee, r.task, r.from_name, r.due_str) for r in rows])
+    except Exception as ex:
+        await send_with_menu(message, f"Импорт не выполнен (ошибка БД): {html.escape(str(ex))}")
+        return
+
+    per_user: dict[str, int] = {}
+    for r in rows:
+        if r.assignee != COMMON_SHEET:
+            per_user[r.assignee] = per_user.get(r.assignee, 0) + 1
+    for name, count in per_user.items():
+        tid = users_map.get(name)
+        if tid is None:
+            continue
+        try:
+            await bot.send_message(tid, f"📬 Тебе добавлено задач: {count}\n\nПосмотреть: /my")
+        except Exception:
+            pass
+
+    await send_with_menu(message, f"Готово ✅ Импортировано задач: {created}")
+
+
 @router.message(Command("unregister"))
 async def cmd_unregister(message: Message):
     if await deny_if_not_allowed(message):
@@ -250,77 +403,66 @@ async def cmd_unregister(message: Message):
 
 
 @router.message(Command("newtask"))
-async def cmd_newtask(message: Message, state: FSMContext):
+async def cmd_newtask(message: Message, state: FSMContext, my_name: Optional[str] = None):
     if await deny_if_not_allowed(message):
         return
 
-    users_map = await users_get_map()
-    my_sheet = get_my_sheet_name_or_none(message.from_user.id, users_map)
-
-    if not my_sheet:
+    if not my_name:
         await send_with_menu(message, "Ты не зарегистрирован. Сначала сделай: /register <ИмяВкладки>")
         return
 
     await state.update_data(from_name=message.from_user.full_name)
     await state.set_state(NewTaskFSM.choosing_assignee)
 
-    await message.answer("Кому поставить задачу?", reply_markup=assignee_keyboard(list(users_map.keys())))
+    await message.answer("Кому поставить задачу?", reply_markup=assignee_keyboard(await users_id_map()))
 
 
 @router.message(Command("my"))
-async def cmd_my(message: Message):
+async def cmd_my(message: Message, my_user_id: Optional[int] = None):
     if await deny_if_not_allowed(message):
         return
 
-    users_map = await users_get_map()
-    my_sheet = get_my_sheet_name_or_none(message.from_user.id, users_map)
-    if not my_sheet:
+    if not my_user_id:
         await send_with_menu(message, "Ты не зарегистрирован. Сделай: /register <ИмяВкладки>")
         return
 
-    await show_tasks(message, my_sheet, "my")
+    await show_tasks(message, my_user_id, "my")
 
 
 @router.message(Command("overdue"))
-async def cmd_overdue(message: Message):
+async def cmd_overdue(message: Message, my_user_id: Optional[int] = None):
     if await deny_if_not_allowed(message):
         return
 
-    users_map = await users_get_map()
-    my_sheet = get_my_sheet_name_or_none(message.from_user.id, users_map)
-    if not my_sheet:
+    if not my_user_id:
         await send_with_menu(message, "Ты не зарегистрирован. Сделай: /register <ИмяВкладки>")
         return
 
-    await show_tasks(message, my_sheet, "overdue")
+    await show_tasks(message, my_user_id, "overdue")
 
 
 @router.message(Command("done"))
-async def cmd_done(message: Message):
+async def cmd_done(message: Message, my_user_id: Optional[int] = None):
     if await deny_if_not_allowed(message):
         return
 
-    users_map = await users_get_map()
-    my_sheet = get_my_sheet_name_or_none(message.from_user.id, users_map)
-    if not my_sheet:
+    if not my_user_id:
         await send_with_menu(message, "Ты не зарегистрирован. Сделай: /register <ИмяВкладки>")
         return
 
-    await show_tasks(message, my_sheet, "done")
+    await show_tasks(message, my_user_id, "done")
 
 
 @router.message(Command("all"))
-async def cmd_all(message: Message):
+async def cmd_all(message: Message, my_user_id: Optional[int] = None):
     if await deny_if_not_allowed(message):
         return
 
-    users_map = await users_get_map()
-    my_sheet = get_my_sheet_name_or_none(message.from_user.id, users_map)
-    if not my_sheet:
+    if not my_user_id:
         await send_with_menu(message, "Ты не зарегистрирован. Сделай: /register <ИмяВкладки>")
         return
 
-    await show_tasks(message, my_sheet, "all")
+    await show_tasks(message, my_user_id, "all")
 
 
 @router.message(Command("team_overdue"))
@@ -333,24 +475,16 @@ async def cmd_team_overdue(message: Message):
         await send_with_menu(message, "В Users нет регистраций.")
         return
 
-    out: List[str] = []
-
-    for name in sorted(users_map.keys()):
-        personal = await tasks_list(name)
-        personal_overdue = [
-            t for t in personal
-            if t.status not in (STATUS_DONE, STATUS_ARCHIVE) and t.due_str and is_overdue(t.due_str)
-        ]
+    # личная + общая просрочка по всем пользователям — один запрос
+    grouped = await team_overdue()
 
-        common_overdue = await common_tasks_for_user(name, "overdue")
+    out: List[str] = []
 
-        if personal_overdue or common_overdue:
-            out.append(f"== {name} ==")
-            for t in personal_overdue:
-                out.append(format_task_line(t.task_id, t.task, t.from_name, t.due_str, t.status, is_common=False))
-            for t in common_overdue:
-                out.append(format_task_line(t.task_id, t.task, t.from_name, t.due_str, t.status, is_common=True))
-            out.append("")
+    for name in sorted(grouped.keys()):
+        out.append(f"== {name} ==")
+        for t, is_common in grouped[name]:
+            out.append(format_task_line(t.task_id, t.task, t.from_name, t.due_str, t.status, is_common=is_common))
+        out.append("")
 
     if not out:
         await send_with_menu(message, "Просроченных задач по команде нет 🎉")
@@ -360,36 +494,146 @@ async def cmd_team_overdue(message: Message):
         await send_with_menu(message, part)
 
 
+# ---------- search ----------
+
+@router.message(Command("search"))
+async def cmd_search(message: Message, state: FSMContext, my_user_id: Optional[int] = None):
+    if await deny_if_not_allowed(message):
+        return
+
+    if not my_user_id:
+        await send_with_menu(message, "Ты не зарегистрирован. Сделай: /register <ИмяВкладки>")
+        return
+
+    parts = (message.text or "").split(maxsplit=1)
+    if len(parts) < 2 or not parts[1].strip():
+        await send_with_menu(message, "Использование: /search <запрос>\nПример: /search отчёт квартал")
+        return
+
+    query = parts[1].strip()
+    await state.update_data(search_query=query)  # для кнопок листания
+    await show_search(message, query, my_user_id, 0)
+
+
+@router.message(Command("search_all"))
+async def cmd_search_all(message: Message, state: FSMContext):
+    if await deny_if_not_allowed(message):
+        return
+    if await deny_if_not_admin(message):
+        return
+
+    parts = (message.text or "").split(maxsplit=1)
+    if len(parts) < 2 or not parts[1].strip():
+        await send_with_menu(message, "Использование: /search_all <запрос>\nИщет по задачам всех пользователей и общим.")
+        return
+
+    query = parts[1].strip()
+    await state.update_data(search_all_query=query)
+    await show_search(message, query, None, 0)
+
+
+async def show_search(message: Message, query: str, user_id: Optional[int], offset: int):
+    """
+    Одна страница результатов поиска (ранжирование и листание — в SQL).
+    user_id=None — админский поиск: у личных задач показываем владельца.
+    """
+    page = await search_tasks(query, user_id, offset)
+
+    if not page.items:
+        await send_with_menu(message, f"По запросу «{html.escape(query)}» ничего не нашлось.")
+        return
+
+    lines = [f"Поиск: «{html.escape(query)}»", ""]
+    for t, is_common, owner in page.items:
+        line = format_task_line(t.task_id, t.task, t.from_name, t.due_str, t.status, is_common=is_common)
+        if user_id is None and not is_common:
+            line = f"👤 {owner}\n{line}"
+        lines.append(line)
+
+    for part in chunk_text(lines):
+        await send_with_menu(message, part)
+
+    if page.has_prev or page.has_next:
+        prefix = "srcha" if user_id is None else "srch"
+        await message.answer(
+            "Ещё результаты:",
+            reply_markup=search_pager_keyboard(prefix, offset, TASKS_PAGE_SIZE, page.has_prev, page.has_next),
+        )
+
+
+@router.callback_query(F.data.startswith("srch:"))
+async def cb_search_page(callback: CallbackQuery, state: FSMContext, my_user_id: Optional[int] = None):
+    if await deny_cb_if_not_allowed(callback):
+        return
+
+    if not my_user_id:
+        await callback.message.answer("Ты не зарегистрирован. Сделай: /register <ИмяВкладки>")
+        await callback.answer()
+        return
+
+    query = (await state.get_data()).get("search_query")
+    if not query:
+        await callback.message.answer("Поиск устарел. Повтори: /search <запрос>")
+        await callback.answer()
+        return
+
+    # srch:<offset>
+    offset = int(callback.data.split(":", 1)[1] or 0)
+    await show_search(callback.message, query, my_user_id, offset)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("srcha:"))
+async def cb_search_all_page(callback: CallbackQuery, state: FSMContext):
+    if await deny_cb_if_not_allowed(callback):
+        return
+    if not is_admin(callback.from_user.id):
+        await callback.message.answer("⛔ Только админам.")
+        await callback.answer()
+        return
+
+    query = (await state.get_data()).get("search_all_query")
+    if not query:
+        await callback.message.answer("Поиск устарел. Повтори: /search_all <запрос>")
+        await callback.answer()
+        return
+
+    # srcha:<offset>
+    offset = int(callback.data.split(":", 1)[1] or 0)
+    await show_search(callback.message, query, None, offset)
+    await callback.answer()
+
+
 # ---------- menu buttons (reply keyboard) ----------
 
 @router.message(F.text == "➕ Новая задача")
-async def btn_newtask(message: Message, state: FSMContext):
-    await cmd_newtask(message, state)
+async def btn_newtask(message: Message, state: FSMContext, my_name: Optional[str] = None):
+    await cmd_newtask(message, state, my_name)
 
 
 @router.message(F.text == "📋 Мои задачи")
-async def btn_my(message: Message):
-    await cmd_my(message)
+async def btn_my(message: Message, my_user_id: Optional[int] = None):
+    await cmd_my(message, my_user_id)
 
 
 @router.message(F.text == "⏰ Просроченные")
-async def btn_overdue(message: Message):
-    await cmd_overdue(message)
+async def btn_overdue(message: Message, my_user_id: Optional[int] = None):
+    await cmd_overdue(message, my_user_id)
 
 
 @router.message(F.text == "✅ Выполненные")
-async def btn_done(message: Message):
-    await cmd_done(message)
+async def btn_done(message: Message, my_user_id: Optional[int] = None):
+    await cmd_done(message, my_user_id)
 
 
 @router.message(F.text == "📦 Все")
-async def btn_all(message: Message):
-    await cmd_all(message)
+async def btn_all(message: Message, my_user_id: Optional[int] = None):
+    await cmd_all(message, my_user_id)
 
 
 @router.message(F.text == "🧾 Помощь")
-async def btn_help(message: Message):
-    await cmd_start(message)
+async def btn_help(message: Message, my_name: Optional[str] = None, my_user_id: Optional[int] = None):
+    await cmd_start(message, my_name, my_user_id)
 
 
 @router.message(F.text == "👥 Регистрации")
@@ -404,12 +648,11 @@ async def btn_admin_tasks(message: Message, state: FSMContext):
     if await deny_if_not_admin(message):
         return
 
-    users_map = await users_get_map()
     await state.set_state(AdminTasksFSM.choosing_user)
 
     await message.answer(
         "Выбери пользователя для просмотра задач:",
-        reply_markup=admin_users_keyboard(list(users_map.keys())),
+        reply_markup=await _admin_users_markup(state),
     )
 
 
@@ -420,8 +663,13 @@ async def pick_assignee(callback: CallbackQuery, state: FSMContext):
     if await deny_cb_if_not_allowed(callback):
         return
 
-    assignee = callback.data.split(":", 1)[1].strip()
-    await state.update_data(assignee=assignee)
+    ok, assignee_id = _parse_owner(callback.data.split(":", 1)[1])
+    assignee = COMMON_SHEET if assignee_id is None else (await users_id_map()).get(assignee_id)
+    if not ok or assignee is None:
+        await callback.message.answer("Не нашёл такого пользователя. Выбери исполнителя ещё раз.")
+        await callback.answer()
+        return
+    await state.update_data(assignee_id=assignee_id, assignee=assignee)
     await state.set_state(NewTaskFSM.entering_task_text)
 
     await callback.message.answer(
@@ -445,9 +693,8 @@ async def newtask_back_to_assignee(callback: CallbackQuery, state: FSMContext):
     if await deny_cb_if_not_allowed(callback):
         return
 
-    users_map = await users_get_map()
     await state.set_state(NewTaskFSM.choosing_assignee)
-    await callback.message.answer("Кому поставить задачу?", reply_markup=assignee_keyboard(list(users_map.keys())))
+    await callback.message.answer("Кому поставить задачу?", reply_markup=assignee_keyboard(await users_id_map()))
     await callback.answer()
 
 
@@ -549,7 +796,7 @@ async def create_task_and_notify(message: Message, state: FSMContext, bot: Bot,
         created_at=created_at,
     )
 
-    task_id = await task_append(assignee, row)  # ВАЖНО: только 1 раз!
+    task_id = await task_append(data.get("assignee_id"), assignee, row)  # ВАЖНО: только 1 раз!
     row.task_id = task_id
 
     if assignee != COMMON_SHEET:
@@ -583,44 +830,15 @@ async def create_task_and_notify(message: Message, state: FSMContext, bot: Bot,
 
 # ---------- tasks view (no filters) ----------
 
-async def show_tasks(message: Message, my_sheet_name: str, mode: str):
-    personal = await tasks_list(my_sheet_name)
-
-    if mode == "my":
-        personal = [t for t in personal if t.status not in (STATUS_DONE, STATUS_ARCHIVE)]
-    elif mode == "overdue":
-        personal = [t for t in personal if t.status not in (STATUS_DONE, STATUS_ARCHIVE) and t.due_str and is_overdue(t.due_str)]
-    elif mode == "done":
-        personal = [t for t in personal if t.status == STATUS_DONE]
-    elif mode == "all":
-        personal = [t for t in personal if t.status != STATUS_ARCHIVE]
-
-    common = await common_tasks_for_user(my_sheet_name, mode)
-
-    # если common модуль когда-то начнёт отдавать ARCHIVE — на всякий случай фильтруем:
-    if mode in ("my", "overdue", "all"):
-        common = [t for t in common if t.status != STATUS_ARCHIVE]
-    if mode == "my":
-        common = [t for t in common if t.status != STATUS_DONE]
-    if mode == "done":
-        common = [t for t in common if t.status == STATUS_DONE]
-
-    combined: List[Tuple[TaskRow, bool]] = []
-    combined += [(t, False) for t in personal]
-    combined += [(t, True) for t in common]
+async def show_tasks(message: Message, my_user_id: int, mode: str, cursor: Optional[str] = None, direction: str = "n"):
+    # одна страница "личные + общие": фильтр режима, сортировка по сроку и keyset — в SQL
+    page = await tasks_page_for_user(my_user_id, mode, cursor, direction)
+    combined = page.items
 
     if not combined:
         await send_with_menu(message, "Нет задач по выбранному списку.")
         return
 
-    def sort_key(item: Tuple[TaskRow, bool]):
-        t, _ = item
-        overdue_flag = 0 if (t.due_str and t.status != STATUS_DONE and is_overdue(t.due_str)) else 1
-        due_val = t.due_str or "9999-12-31"
-        return (overdue_flag, due_val)
-
-    combined.sort(key=sort_key)
-
     lines = [
         format_task_line(t.task_id, t.task, t.from_name, t.due_str, t.status, is_common=is_common)
         for (t, is_common) in combined
@@ -638,19 +856,47 @@ async def show_tasks(message: Message, my_sheet_name: str, mode: str):
             if is_common:
                 await message.answer(f"Отметить выполненной ОБЩУЮ задачу [{t.task_id}]?", reply_markup=done_common_keyboard(t.task_id))
             else:
-                await message.answer(f"Отметить выполненной задачу [{t.task_id}]?", reply_markup=done_personal_keyboard(my_sheet_name, t.task_id))
+                await message.answer(f"Отметить выполненной задачу [{t.task_id}]?", reply_markup=done_personal_keyboard(t.task_id))
+
+    if page.has_prev or page.has_next:
+        await message.answer(
+            "Ещё задачи:",
+            reply_markup=tasks_pager_keyboard(mode, page.has_prev, page.has_next, page.first_cursor, page.last_cursor),
+        )
+
+
+@router.callback_query(F.data.startswith("tpage:"))
+async def cb_tasks_page(callback: CallbackQuery, my_user_id: Optional[int] = None):
+    if await deny_cb_if_not_allowed(callback):
+        return
+
+    if not my_user_id:
+        await callback.message.answer("Ты не зарегистрирован. Сделай: /register <ИмяВкладки>")
+        await callback.answer()
+        return
+
+    # tpage:<mode>:<n|p>:<cursor>
+    _p, mode, direction, cursor = callback.data.split(":", 3)
+    await show_tasks(callback.message, my_user_id, mode, cursor, direction)
+    await callback.answer()
 
 
 # ---------- DONE callbacks ----------
 
 @router.callback_query(F.data.startswith("done_personal:"))
-async def cb_done_personal(callback: CallbackQuery):
+async def cb_done_personal(callback: CallbackQuery, my_user_id: Optional[int] = None):
     if await deny_cb_if_not_allowed(callback):
         return
 
-    _prefix, sheet_name, task_id = callback.data.split(":", 2)
+    if not my_user_id:
+        await callback.message.answer("Ты не зарегистрирован. Сделай: /register <ИмяВкладки>")
+        await callback.answer()
+        return
 
-    ok = await task_set_done(sheet_name, task_id)
+    # done_personal:<task_id> (в старых сообщениях было done_personal:<лист>:<task_id>)
+    task_id = callback.data.rsplit(":", 1)[1]
+
+    ok = await task_set_done(my_user_id, task_id)
     if ok:
         await callback.message.answer(f"Готово ✅ Задача [{task_id}] отмечена как DONE.")
     else:
@@ -660,21 +906,18 @@ async def cb_done_personal(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("done_common:"))
-async def cb_done_common(callback: CallbackQuery):
+async def cb_done_common(callback: CallbackQuery, my_name: Optional[str] = None, my_user_id: Optional[int] = None):
     if await deny_cb_if_not_allowed(callback):
         return
 
     task_id = callback.data.split(":", 1)[1].strip()
 
-    users_map = await users_get_map()
-    my_name = get_my_sheet_name_or_none(callback.from_user.id, users_map)
-
-    if not my_name:
+    if not my_name or not my_user_id:
         await callback.message.answer("Ты не зарегистрирован. Сделай: /register <ИмяВкладки>")
         await callback.answer()
         return
 
-    await common_progress_set_done(task_id, my_name)
+    await common_progress_set_done(task_id, my_user_id, my_name)
     await callback.message.answer(f"Готово ✅ Общая задача [{task_id}] отмечена DONE для {my_name}.")
     await callback.answer()
 
@@ -698,9 +941,8 @@ async def admin_back_users(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
 
-    users_map = await users_get_map()
     await state.set_state(AdminTasksFSM.choosing_user)
-    await callback.message.answer("Выбери пользователя:", reply_markup=admin_users_keyboard(list(users_map.keys())))
+    await callback.message.answer("Выбери пользователя:", reply_markup=await _admin_users_markup(state))
     await callback.answer()
 
 
@@ -732,8 +974,21 @@ async def admin_pick_user(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
 
-    sheet = callback.data.split(":", 1)[1].strip()
-    await state.update_data(admin_sheet=sheet)
+    token = callback.data.split(":", 1)[1]
+    if token.startswith(f"{TAB_OWNER}:"):
+        # admin_user:tab:<индекс в admin_tabs>
+        tabs = (await state.get_data()).get("admin_tabs") or []
+        idx = token.split(":", 1)[1]
+        ok, user_id = idx.isdigit(), None
+        sheet = tabs[int(idx)] if ok and int(idx) < len(tabs) else None
+    else:
+        ok, user_id = _parse_owner(token)
+        sheet = COMMON_SHEET if user_id is None else (await users_id_map()).get(user_id)
+    if not ok or sheet is None:
+        await callback.message.answer("Не нашёл такого пользователя. Выбери ещё раз.")
+        await callback.answer()
+        return
+    await state.update_data(admin_user_id=user_id, admin_sheet=sheet)
     await state.set_state(AdminTasksFSM.choosing_view)
 
     await callback.message.answer(
@@ -756,53 +1011,83 @@ async def admin_pick_view(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     sheet = data.get("admin_sheet")
 
-    if not sheet:
+    if not sheet or "admin_user_id" not in data:
         await callback.message.answer("Не выбран пользователь. Нажми 🛠 Админ: задачи ещё раз.")
         await callback.answer()
         return
 
     await state.update_data(admin_view_mode=mode)
 
-    await admin_show_tasks(callback.message, sheet, mode)
+    page = await admin_show_tasks(callback.message, data.get("admin_user_id"), sheet, mode)
 
-    await callback.message.answer("Навигация:", reply_markup=admin_nav_keyboard())
+    await callback.message.answer("Навигация:", reply_markup=admin_nav_keyboard(mode, page))
     await callback.answer()
 
 
-async def admin_show_tasks(message: Message, sheet: str, mode: str):
+@router.callback_query(F.data.startswith("apage:"))
+async def cb_admin_page(callback: CallbackQuery, state: FSMContext):
+    if await deny_cb_if_not_allowed(callback):
+        return
+    if not is_admin(callback.from_user.id):
+        await callback.message.answer("⛔ Только админам.")
+        await callback.answer()
+        return
+
+    data = await state.get_data()
+    sheet = data.get("admin_sheet")
+    if not sheet or "admin_user_id" not in data:
+        await callback.message.answer("Не выбран пользователь. Нажми 🛠 Админ: задачи ещё раз.")
+        await callback.answer()
+        return
+
+    # apage:<mode>:<n|p>:<cursor>
+    _p, mode, direction, cursor = callback.data.split(":", 3)
+    page = await admin_show_tasks(callback.message, data.get("admin_user_id"), sheet, mode, cursor, direction)
+
+    await callback.message.answer("Навигация:", reply_markup=admin_nav_keyboard(mode, page))
+    await callback.answer()
+
+
+async def admin_show_tasks(
+    message: Message,
+    user_id: Optional[int],
+    sheet: str,
+    mode: str,
+    cursor: Optional[str] = None,
+    direction: str = "n",
+) -> Optional[TaskPage]:
     """
-    Админ: показывает задачи конкретного листа без период-фильтров.
+    Админ: показывает одну страницу задач пользователя user_id без период-фильтров;
+    sheet — имя для заголовка, а при user_id None — вкладка ("Общие" или лист без пользователя).
     ARCHIVE скрываем в all/my/overdue, а done показывает только DONE.
+    Возвращаем страницу (для кнопок листания) или None, если задач нет.
     """
-    all_tasks = await tasks_list(sheet)
-
-    if mode == "my":
-        tasks = [t for t in all_tasks if t.status not in (STATUS_DONE, STATUS_ARCHIVE)]
-    elif mode == "overdue":
-        tasks = [t for t in all_tasks if t.status not in (STATUS_DONE, STATUS_ARCHIVE) and t.due_str and is_overdue(t.due_str)]
-    elif mode == "done":
-        tasks = [t for t in all_tasks if t.status == STATUS_DONE]
-    else:
-        tasks = [t for t in all_tasks if t.status != STATUS_ARCHIVE]
+    # фильтр режима, сортировка по сроку и keyset — в SQL
+    page = await tasks_page(user_id, mode, cursor, direction, sheet=sheet)
+    unowned_tab = user_id is None and sheet != COMMON_SHEET
 
-    if not tasks:
-        await send_with_menu(message, f"Админ просмотр: {sheet}\nРежим: {mode}\nНет задач.")
-        return
+    header = f"Админ просмотр: {sheet}\nРежим: {mode}"
+    if user_id is not None:
+        c = await task_counters(user_id)
+        header += "\n" + format_counters_line(c.open, c.overdue, c.done)
+
+    if not page.items:
+        await send_with_menu(message, f"{header}\nНет задач.")
+        return None
 
-    await send_with_menu(message, f"Админ просмотр: {sheet}\nРежим: {mode}\nЗадач: {len(tasks)}")
+    await send_with_menu(message, header)
 
-    # сортировка по due
-    tasks.sort(key=lambda t: (t.due_str or "9999-12-31"))
+    for t, _is_common in page.items:
+        line = format_task_line(t.task_id, t.task, t.from_name, t.due_str, t.status, is_common=(user_id is None and not unowned_tab))
+        await message.answer(line, reply_markup=admin_task_actions_keyboard(user_id, t.task_id, t.status, tab=unowned_tab))
 
-    for t in tasks:
-        line = format_task_line(t.task_id, t.task, t.from_name, t.due_str, t.status, is_common=(sheet == COMMON_SHEET))
-        await message.answer(line, reply_markup=admin_task_actions_keyboard(sheet, t.task_id, t.status))
+    return page
 
 
 # ---------- ADMIN: edit / delete / status callbacks (no confirms) ----------
 
 @router.callback_query(F.data.startswith("admin_toggle:"))
-async def cb_admin_toggle(callback: CallbackQuery):
+async def cb_admin_toggle(callback: CallbackQuery, state: FSMContext):
     if await deny_cb_if_not_allowed(callback):
         return
     if not is_admin(callback.from_user.id):
@@ -810,9 +1095,14 @@ async def cb_admin_toggle(callback: CallbackQuery):
         await callback.answer()
         return
 
-    _p, sheet, task_id, new_status = callback.data.split(":", 3)
+    _p, owner, task_id, new_status = callback.data.split(":", 3)
+    valid, user_id, sheet = await _admin_owner(owner, state)
+    if not valid:
+        await callback.message.answer("Кнопка устарела. Открой список задач заново.")
+        await callback.answer()
+        return
 
-    ok = await task_set_status(sheet, task_id, new_status)
+    ok = await task_set_status(user_id, task_id, new_status, sheet)
     if ok:
         await callback.message.answer(f"✅ Готово. Задача [{task_id}] теперь в статусе: {new_status}")
     else:
@@ -822,7 +1112,7 @@ async def cb_admin_toggle(callback: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("admin_delete:"))
-async def cb_admin_delete(callback: CallbackQuery):
+async def cb_admin_delete(callback: CallbackQuery, state: FSMContext):
     if await deny_cb_if_not_allowed(callback):
         return
     if not is_admin(callback.from_user.id):
@@ -830,9 +1120,14 @@ async def cb_admin_delete(callback: CallbackQuery):
         await callback.answer()
         return
 
-    _p, sheet, task_id = callback.data.split(":", 2)
+    _p, owner, task_id = callback.data.split(":", 2)
+    valid, user_id, sheet = await _admin_owner(owner, state)
+    if not valid:
+        await callback.message.answer("Кнопка устарела. Открой список задач заново.")
+        await callback.answer()
+        return
 
-    ok = await task_delete(sheet, task_id)
+    ok = await task_delete(user_id, task_id, sheet)
     if ok:
         await callback.message.answer(f"🗑 Удалено. Задача [{task_id}] удалена.")
     else:
@@ -850,9 +1145,14 @@ async def cb_admin_edit_text(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
 
-    _p, sheet, task_id = callback.data.split(":", 2)
+    _p, owner, task_id = callback.data.split(":", 2)
+    valid, user_id, sheet = await _admin_owner(owner, state)
+    if not valid:
+        await callback.message.answer("Кнопка устарела. Открой список задач заново.")
+        await callback.answer()
+        return
 
-    await state.update_data(edit_sheet=sheet, edit_task_id=task_id)
+    await state.update_data(edit_user_id=user_id, edit_sheet=sheet, edit_task_id=task_id)
     await state.set_state(AdminTasksFSM.editing_text)
 
     await callback.message.answer(f"✏️ Введи новый ТЕКСТ для задачи [{task_id}]:")
@@ -872,15 +1172,14 @@ async def admin_edit_text_enter(message: Message, state: FSMContext):
         return
 
     data = await state.get_data()
-    sheet = data.get("edit_sheet")
     task_id = data.get("edit_task_id")
 
-    if not sheet or not task_id:
+    if "edit_user_id" not in data or not task_id:
         await send_with_menu(message, "Ошибка состояния редактирования. Нажми 🛠 Админ: задачи заново.")
         await state.clear()
         return
 
-    ok = await task_update_text(sheet, task_id, new_text)
+    ok = await task_update_text(data["edit_user_id"], task_id, new_text, data.get("edit_sheet", COMMON_SHEET))
     if ok:
         await send_with_menu(message, f"✅ Готово. Текст задачи [{task_id}] обновлён.")
     else:
@@ -898,9 +1197,14 @@ async def cb_admin_edit_due(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
 
-    _p, sheet, task_id = callback.data.split(":", 2)
+    _p, owner, task_id = callback.data.split(":", 2)
+    valid, user_id, sheet = await _admin_owner(owner, state)
+    if not valid:
+        await callback.message.answer("Кнопка устарела. Открой список задач заново.")
+        await callback.answer()
+        return
 
-    await state.update_data(edit_sheet=sheet, edit_task_id=task_id)
+    await state.update_data(edit_user_id=user_id, edit_sheet=sheet, edit_task_id=task_id)
     await state.set_state(AdminTasksFSM.editing_due)
 
     await callback.message.answer(
@@ -924,15 +1228,14 @@ async def admin_edit_due_enter(message: Message, state: FSMContext):
         return
 
     data = await state.get_data()
-    sheet = data.get("edit_sheet")
     task_id = data.get("edit_task_id")
 
-    if not sheet or not task_id:
+    if "edit_user_id" not in data or not task_id:
         await send_with_menu(message, "Ошибка состояния редактирования. Нажми 🛠 Админ: задачи заново.")
         await state.clear()
         return
 
-    ok = await task_update_due(sheet, task_id, due_iso)
+    ok = await task_update_due(data["edit_user_id"], task_id, due_iso, data.get("edit_sheet", COMMON_SHEET))
     if ok:
         await send_with_menu(message, f"✅ Готово. Срок задачи [{task_id}] обновлён на {due_iso}.")
     else:
@@ -966,5 +1269,14 @@ async def catch_any_text_show_menu(message: Message):
 
 def build_dispatcher() -> Dispatcher:
     dp = Dispatcher(storage=MemoryStorage())
+
+    # middleware'ы — на новый Dispatcher, а не на глобальный router: повторная сборка их не дублирует
+    # имя и users.id вызывающего -> data хендлеров (my_name / my_user_id)
+    dp.message.middleware(IdentityMiddleware())
+    dp.callback_query.middleware(IdentityMiddleware())
+    # одна сессия чтения БД на апдейт (после Identity — ей нужен current_actor)
+    dp.message.middleware(DbSessionMiddleware())
+    dp.callback_query.middleware(DbSessionMiddleware())
+
     dp.include_router(router)
     return dp
@@ -3,7 +3,16 @@
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
-from taskbot.config import COMMON_SHEET
+# В callback_data владельца задач передаём как users.id, лист "Общие" (без пользователя) — так:
+COMMON_OWNER = "common"
+# вкладка без пользователя, выбранная в админ-просмотре (имя в callback_data не влезает — оно в FSM)
+TAB_OWNER = "tab"
+
+
+def owner_token(user_id: int | None, tab: bool = False) -> str:
+    if user_id is not None:
+        return str(user_id)
+    return TAB_OWNER if tab else COMMON_OWNER
 
 
 # --------------------- REPLY MENU ---------------------
@@ -33,16 +42,16 @@ def main_menu_keyboard(is_admin: bool) -> ReplyKeyboardMarkup:
 
 # --------------------- NEW TASK (INLINE) ---------------------
 
-def assignee_keyboard(user_names: list[str]):
+def assignee_keyboard(users: dict[int, str]):
     """
-    Выбор исполнителя + "Общие" + выход в меню.
+    Выбор исполнителя ({users.id: имя}) + "Общие" + выход в меню.
     """
     kb = InlineKeyboardBuilder()
 
-    for name in sorted(user_names):
-        kb.button(text=name, callback_data=f"assignee:{name}")
+    for user_id, name in sorted(users.items(), key=lambda kv: kv[1]):
+        kb.button(text=name, callback_data=f"assignee:{user_id}")
 
-    kb.button(text="📌 Общие", callback_data=f"assignee:{COMMON_SHEET}")
+    kb.button(text="📌 Общие", callback_data=f"assignee:{COMMON_OWNER}")
     kb.button(text="⬅️ В меню", callback_data="newtask_cancel")
 
     kb.adjust(2)
@@ -86,9 +95,10 @@ def newtask_back_from_manual_due_keyboard():
     return kb.as_markup()
 
 
-def done_personal_keyboard(sheet_name: str, task_id: str):
+def done_personal_keyboard(task_id: str):
+    # владелец — тот, кто нажал (my_user_id), в callback_data только id задачи
     kb = InlineKeyboardBuilder()
-    kb.button(text="✅ Done", callback_data=f"done_personal:{sheet_name}:{task_id}")
+    kb.button(text="✅ Done", callback_data=f"done_personal:{task_id}")
     return kb.as_markup()
 
 
@@ -98,18 +108,49 @@ def done_common_keyboard(task_id: str):
     return kb.as_markup()
 
 
+def tasks_pager_keyboard(mode: str, has_prev: bool, has_next: bool, first_cursor: str | None, last_cursor: str | None):
+    """
+    Листание списка задач пользователя: "назад" от первой строки, "вперёд" от последней.
+    """
+    kb = InlineKeyboardBuilder()
+    if has_prev and first_cursor:
+        kb.button(text="⬅️ Назад", callback_data=f"tpage:{mode}:p:{first_cursor}")
+    if has_next and last_cursor:
+        kb.button(text="Вперёд ➡️", callback_data=f"tpage:{mode}:n:{last_cursor}")
+    kb.adjust(2)
+    return kb.as_markup()
+
+
+def search_pager_keyboard(prefix: str, offset: int, page_size: int, has_prev: bool, has_next: bool):
+    """
+    Листание результатов поиска (prefix: srch — свой поиск, srcha — админский).
+    Сам запрос лежит в FSM-данных: в callback_data (64 байта) он может не влезть.
+    """
+    kb = InlineKeyboardBuilder()
+    if has_prev:
+        kb.button(text="⬅️ Назад", callback_data=f"{prefix}:{max(offset - page_size, 0)}")
+    if has_next:
+        kb.button(text="Вперёд ➡️", callback_data=f"{prefix}:{offset + page_size}")
+    kb.adjust(2)
+    return kb.as_markup()
+
+
 # --------------------- ADMIN (INLINE) ---------------------
 
-def admin_users_keyboard(user_names: list[str]):
+def admin_users_keyboard(users: dict[int, str], tabs: list[str] | None = None):
     """
-    Админ: выбрать пользователя или "Общие", либо выйти.
+    Админ: выбрать пользователя ({users.id: имя}), вкладку без пользователя
+    (tabs — по индексу в списке, сам список хранится в FSM) или "Общие", либо выйти.
     """
     kb = InlineKeyboardBuilder()
 
-    for name in sorted(user_names):
-        kb.button(text=name, callback_data=f"admin_user:{name}")
+    for user_id, name in sorted(users.items(), key=lambda kv: kv[1]):
+        kb.button(text=name, callback_data=f"admin_user:{user_id}")
+
+    for i, name in enumerate(tabs or []):
+        kb.button(text=f"👻 {name}", callback_data=f"admin_user:{TAB_OWNER}:{i}")
 
-    kb.button(text="📌 Общие", callback_data=f"admin_user:{COMMON_SHEET}")
+    kb.button(text="📌 Общие", callback_data=f"admin_user:{COMMON_OWNER}")
     kb.button(text="⬅️ В меню", callback_data="admin_back:exit")
 
     kb.adjust(2)
@@ -131,33 +172,44 @@ def admin_view_keyboard():
     return kb.as_markup()
 
 
-def admin_nav_keyboard():
+def admin_nav_keyboard(mode: str | None = None, page=None):
     """
     Админ: навигация после просмотра списка задач.
+    Если передана страница (TaskPage) — добавляем кнопки листания.
     """
     kb = InlineKeyboardBuilder()
+    pager = 0
+    if page is not None and mode:
+        if page.has_prev and page.first_cursor:
+            kb.button(text="⬅️ Пред. страница", callback_data=f"apage:{mode}:p:{page.first_cursor}")
+            pager += 1
+        if page.has_next and page.last_cursor:
+            kb.button(text="След. страница ➡️", callback_data=f"apage:{mode}:n:{page.last_cursor}")
+            pager += 1
     kb.button(text="⬅️ Назад к режиму", callback_data="admin_back:views")
     kb.button(text="⬅️ Назад к пользователям", callback_data="admin_back:users")
     kb.button(text="⬅️ В меню", callback_data="admin_back:exit")
-    kb.adjust(1)
+    kb.adjust(*([pager] if pager else []), 1)
     return kb.as_markup()
 
 
-def admin_task_actions_keyboard(sheet_name: str, task_id: str, status: str):
+def admin_task_actions_keyboard(user_id: int | None, task_id: str, status: str, tab: bool = False):
     """
-    Админ: действия над задачей.
+    Админ: действия над задачей пользователя user_id
+    (None — лист "Общие", с tab=True — выбранная вкладка без пользователя).
     """
     kb = InlineKeyboardBuilder()
+    owner = owner_token(user_id, tab)
 
-    kb.button(text="✏️ Текст", callback_data=f"admin_edit_text:{sheet_name}:{task_id}")
-    kb.button(text="📅 Срок", callback_data=f"admin_edit_due:{sheet_name}:{task_id}")
+    kb.button(text="✏️ Текст", callback_data=f"admin_edit_text:{owner}:{task_id}")
+    kb.button(text="📅 Срок", callback_data=f"admin_edit_due:{owner}:{task_id}")
 
     if status == "DONE":
-        kb.button(text="↩️ Вернуть в TODO", callback_data=f"admin_toggle:{sheet_name}:{task_id}:TODO")
+        kb.button(text="↩️ Вернуть в TODO", callback_data=f"admin_toggle:{owner}:{task_id}:TODO")
     else:
-        kb.button(text="✅ В DONE", callback_data=f"admin_toggle:{sheet_name}:{task_id}:DONE")
+        kb.button(text="✅ В DONE", callback_data=f"admin_toggle:{owner}:{task_id}:DONE")
 
-    kb.button(text="🗑 Удалить", callback_data=f"admin_delete:{sheet_name}:{task_id}")
+    kb.button(text="🗑 Удалить", callback_data=f"admin_delete:{owner}:{task_id}")
 
     kb.adjust(2)
     return kb.as_markup()
@@ -0,0 +1,77 @@
+# middlewares.py — middleware'ы aiogram
+
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject
+
+from taskbot.storage.sql.db import current_actor, request_session_scope, release_read_session
+from taskbot.storage.sql.users_directory import user_directory
+
+
+class IdentityMiddleware(BaseMiddleware):
+    """
+    Кладём в data хендлера:
+    - my_name: зарегистрированное имя (вкладка) вызывающего или None;
+    - my_user_id: его users.id или None — по нему репозитории ищут задачи.
+    Права админа хендлеры проверяют сами (is_admin — проверка по множеству из config).
+    Имя и id берутся из in-process справочника, запросов к users нет.
+    Заодно выставляем current_actor — по нему db.read_session решает, читать ли с реплики.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        current_actor.set(user.id if user is not None else None)
+        if user is not None:
+            data["my_name"] = await user_directory.name_by_tid(user.id)
+            data["my_user_id"] = await user_directory.id_by_tid(user.id)
+        else:
+            data["my_name"] = None
+            data["my_user_id"] = None
+        return await handler(event, data)
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Одна сессия чтения на апдейт: репозитории берут её из contextvar (db.read_session),
+    поэтому все чтения хендлера идут через одно соединение пула вместо отдельного на каждый запрос.
+    Сессия открывается лениво — апдейты без чтений соединение не берут,
+    и закрывается перед первым запросом к Telegram (см. ReleaseReadSessionMiddleware).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with request_session_scope():
+            return await handler(event, data)
+
+
+class ReleaseReadSessionMiddleware(BaseRequestMiddleware):
+    """
+    Middleware запросов бота к Telegram API (bot.session.middleware).
+    Хендлер сначала читает, потом шлёт сообщения: перед каждой отправкой отпускаем сессию
+    чтения апдейта, чтобы соединение пула и снимок не держались, пока идут запросы к Telegram.
+    Вне апдейта (напоминания) сессии нет — ничего не делает.
+    """
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        await release_read_session()
+        return await make_request(bot, method)
@@ -0,0 +1,197 @@
+# taskbot/tg/reminders.py
+# Напоминания о сроках: "скоро срок" и "просрочено".
+#
+# Задачи со сроком в ближайшем окне лежат в min-куче по времени срабатывания;
+# цикл спит до ближайшего срабатывания или до NOTIFY из outbox (задачу создали/закрыли/перенесли),
+# а не опрашивает таблицу раз в минуту. Окно перечитывается раз в час одним запросом по due_at.
+# Что уже отправлено — в reminders_sent, поэтому рестарт бота не повторяет напоминания.
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import html
+import time
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+
+from taskbot.config import (
+    IS_SQLITE,
+    SYNC_POLL_INTERVAL,
+    REMINDER_SOON_MINUTES,
+    REMINDER_WINDOW_HOURS,
+    REMINDER_CATCHUP_MINUTES,
+)
+from taskbot.storage.sql.notify import listen_forever
+from taskbot.storage.sql.outbox import OUTBOX_CHANNEL, outbox_tail, outbox_last_id
+from taskbot.storage.sql.reminders_repo import (
+    KIND_TASK,
+    KIND_COMMON,
+    reminder_window,
+    reminder_lookup,
+    reminders_sent_since,
+    reminder_claim,
+    reminders_sent_cleanup,
+)
+from taskbot.storage.sql.rows import due_to_str
+
+SOON = "soon"
+OVERDUE = "overdue"
+
+# как часто перечитываем окно целиком (сек): подбирает задачи, вошедшие в окно по времени,
+# и всё, что могли пропустить по событиям
+RELOAD_INTERVAL = 60 * 60
+# записи reminders_sent старше этого удаляем при перечитывании окна
+SENT_KEEP = timedelta(days=7)
+# события, после которых срок задачи мог измениться
+_TASK_EVENTS = {"TASK_CREATED", "TASK_STATUS", "TASK_DUE", "TASK_PATCH", "TASK_DELETE"}
+_COMMON_EVENTS = {"COMMON_CREATED", "COMMON_STATUS"}
+
+
+class ReminderScheduler:
+    """
+    Куча: (когда сработать, kind, task_id, reminder, due_at).
+    Устаревшие записи (задачу закрыли или перенесли) из кучи не удаляем — они отбрасываются
+    при извлечении сверкой с _due (актуальный срок задачи в окне).
+    """
+
+    def __init__(self, bot: Bot) -> None:
+        self._bot = bot
+        self._soon = timedelta(minutes=REMINDER_SOON_MINUTES)
+        self._catchup = timedelta(minutes=REMINDER_CATCHUP_MINUTES)
+        self._heap: list[tuple[datetime, str, int, str, datetime]] = []
+        self._due: dict[tuple[str, int], datetime] = {}
+        self._sent: set[tuple[str, int, str, datetime]] = set()
+        self._window_end = datetime.min
+        self._last_event_id = 0
+        self._wakeup = asyncio.Event()
+
+    def _schedule(self, kind: str, task_id: int, due_at: datetime, now: datetime) -> None:
+        self._due[(kind, task_id)] = due_at
+        for reminder, fire_at in ((SOON, due_at - self._soon), (OVERDUE, due_at)):
+            if (kind, task_id, reminder, due_at) in self._sent:
+                continue
+            if reminder == SOON and due_at <= now:
+                continue  # срок уже прошёл — "скоро" не нужно
+            if reminder == OVERDUE and due_at < now - self._catchup:
+                continue
+            heapq.heappush(self._heap, (fire_at, kind, task_id, reminder, due_at))
+
+    async def _reload(self) -> None:
+        """
+        Окно [now - catchup, now + window] одним запросом; кучу строим заново.
+        Позицию в outbox берём ДО чтения окна: событие между ними применится повторно, это безопасно.
+        """
+        now = datetime.now()
+        lo = now - self._catchup
+        self._last_event_id = await outbox_last_id()
+        await reminders_sent_cleanup(now - SENT_KEEP)
+        items = await reminder_window(lo, now + timedelta(hours=REMINDER_WINDOW_HOURS))
+        self._sent = await reminders_sent_since(lo)
+
+        self._heap = []
+        self._due = {}
+        self._window_end = now + timedelta(hours=REMINDER_WINDOW_HOURS)
+        for it in items:
+            self._schedule(it.kind, it.task_id, it.due_at, now)
+
+    async def _apply_events(self) -> None:
+        """
+        Читаем хвост outbox после последнего увиденного id и перечитываем срок затронутых задач.
+        """
+        while True:
+            events = await outbox_tail(self._last_event_id)
+            if not events:
+                return
+            self._last_event_id = events[-1].id
+
+            task_ids: set[int] = set()
+            common_ids: set[int] = set()
+            for e in events:
+                payload = e.payload or {}
+                if "task_id" not in payload:
+                    continue
+                if e.event_type in _TASK_EVENTS:
+                    task_ids.add(int(payload["task_id"]))
+                elif e.event_type in _COMMON_EVENTS:
+                    common_ids.add(int(payload["task_id"]))
+
+            current = {(it.kind, it.task_id): it.due_at for it in await reminder_lookup(task_ids, common_ids)}
+            now = datetime.now()
+            for key in [(KIND_TASK, i) for i in task_ids] + [(KIND_COMMON, i) for i in common_ids]:
+                due_at = current.get(key)
+                if due_at is None or due_at > self._window_end:
+                    self._due.pop(key, None)  # закрыта, удалена или вне окна — подберёт перечитывание
+                elif self._due.get(key) != due_at:
+                    self._schedule(key[0], key[1], due_at, now)
+
+    async def _send(self, kind: str, task_id: int, reminder: str, due_at: datetime) -> None:
+        claimed = await reminder_claim(kind, task_id, reminder, due_at)
+        self._sent.add((kind, task_id, reminder, due_at))
+        if claimed is None:
+            return
+        task_text, telegram_ids = claimed
+
+        mark = "📌 " if kind == KIND_COMMON else ""
+        if reminder == SOON:
+            head = f"⏰ Скоро срок: {mark}[{task_id}] {html.escape(task_text)}"
+        else:
+            head = f"⚠️ Просрочено: {mark}[{task_id}] {html.escape(task_text)}"
+        text = f"{head}\nСрок: {due_to_str(due_at)}\n\nПосмотреть: /my"
+
+        for tid in telegram_ids:
+            try:
+                await self._bot.send_message(tid, text)
+            except Exception:
+                pass
+
+    async def _fire_due(self) -> None:
+        now = datetime.now()
+        while self._heap and self._heap[0][0] <= now:
+            _fire_at, kind, task_id, reminder, due_at = heapq.heappop(self._heap)
+            if self._due.get((kind, task_id)) != due_at:
+                continue  # запись устарела
+            if (kind, task_id, reminder, due_at) in self._sent:
+                continue
+            await self._send(kind, task_id, reminder, due_at)
+
+    def _sleep_seconds(self, next_reload: float) -> float:
+        timeout = next_reload - time.monotonic()
+        if self._heap:
+            timeout = min(timeout, (self._heap[0][0] - datetime.now()).total_seconds())
+        if IS_SQLITE:
+            timeout = min(timeout, SYNC_POLL_INTERVAL)  # NOTIFY нет — хвост outbox опрашиваем
+        return max(timeout, 0.0)
+
+    async def run(self) -> None:
+        # NOTIFY из outbox_add будит цикл; после (пере)подключения — тоже
+        listener = asyncio.create_task(
+            listen_forever(OUTBOX_CHANNEL, lambda _payload: self._wakeup.set(), self._wakeup.set)
+        )
+        next_reload = 0.0
+        try:
+            while True:
+                try:
+                    if time.monotonic() >= next_reload:
+                        await self._reload()
+                        next_reload = time.monotonic() + RELOAD_INTERVAL
+                    else:
+                        await self._apply_events()
+                    await self._fire_due()
+                except Exception as ex:
+                    # чтобы напоминания не умерли вместе с ботом
+                    print("REMINDERS ERROR:", ex)
+                    await asyncio.sleep(5)
+
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self._sleep_seconds(next_reload))
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+        finally:
+            listener.cancel()
+
+
+async def reminders_loop(bot: Bot) -> None:
+    await ReminderScheduler(bot).run()
@@ -5,6 +5,13 @@ from taskbot.config import STATUS_DONE  # статус DONE
 from taskbot.utils.dates import is_overdue  # проверка просрочки
 
 
+def format_counters_line(open_count: int, overdue_count: int, done_count: int) -> str:
+    """
+    Строка-сводка для меню: сколько открыто / просрочено / выполнено.
+    """
+    return f"📊 Открыто: {open_count} | ⚠️ Просрочено: {overdue_count} | ✅ Выполнено: {done_count}"
+
+
 def format_task_line(task_id: str, task: str, from_name: str, due_str: str, status: str, is_common: bool) -> str:
     """
     Форматируем одну задачу для вывода.
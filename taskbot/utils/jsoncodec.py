@@ -0,0 +1,26 @@
+# jsoncodec.py — JSON для outbox: orjson, если установлен, иначе stdlib json
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson — необязательная зависимость
+    orjson = None
+
+
+if orjson is not None:
+    def dumps(obj: Any) -> str:
+        # orjson всегда пишет UTF-8 без \u-экранирования (как ensure_ascii=False)
+        return orjson.dumps(obj).decode("utf-8")
+
+    def loads(raw: str | bytes) -> Any:
+        return orjson.loads(raw)
+else:
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    def loads(raw: str | bytes) -> Any:
+        return json.loads(raw)
@@ -0,0 +1,135 @@
+# task_import.py — разбор файла с задачами для /import (CSV или XLSX)
+
+from __future__ import annotations
+
+import csv
+import io
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+
+from taskbot.utils.dates import normalize_due_date
+
+# допустимые заголовки колонок (регистр не важен)
+_COLUMNS = {
+    "assignee": {"assignee", "кому", "исполнитель"},
+    "task": {"task", "text", "задача", "текст"},
+    "due": {"due", "срок"},
+    "from_name": {"from", "from_name", "от", "от кого"},
+}
+
+
+@dataclass
+class ImportRow:
+    assignee: str
+    task: str
+    due_str: str
+    from_name: str
+
+
+def _read_csv(data: bytes) -> List[List[str]]:
+    text = data.decode("utf-8-sig")
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    return [row for row in csv.reader(io.StringIO(text), dialect)]
+
+
+def _read_xlsx(data: bytes) -> List[List[str]]:
+    # openpyxl нужен только для XLSX — импортируем лениво
+    from openpyxl import load_workbook
+
+    wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        out = []
+        for values in ws.iter_rows(values_only=True):
+            row = []
+            for v in values:
+                if v is None:
+                    row.append("")
+                elif isinstance(v, datetime):
+                    # ячейка-дата: отдаём в формате, который понимает normalize_due_date
+                    row.append(v.strftime("%Y-%m-%d %H:%M") if (v.hour or v.minute) else v.strftime("%Y-%m-%d"))
+                elif isinstance(v, date):
+                    row.append(v.strftime("%Y-%m-%d"))
+                else:
+                    row.append(str(v))
+            out.append(row)
+        return out
+    finally:
+        wb.close()
+
+
+def _header_index(header: List[str]) -> dict:
+    idx = {}
+    for i, name in enumerate(header):
+        key = (name or "").strip().lower()
+        for field, aliases in _COLUMNS.items():
+            if key in aliases and field not in idx:
+                idx[field] = i
+    return idx
+
+
+def parse_import_file(
+    filename: str,
+    data: bytes,
+    known_assignees: set[str],
+    default_from: str,
+    max_rows: int,
+) -> Tuple[List[ImportRow], List[str]]:
+    """
+    Разбираем файл: первая строка — заголовки (assignee, task, due, from).
+    Срок проверяется по правилам normalize_due_date (пусто — без срока),
+    исполнитель должен быть зарегистрирован (или лист общих задач).
+    Возвращаем (строки, ошибки "строка N: ..."). Пустые строки пропускаем.
+    """
+    if filename.lower().endswith(".xlsx"):
+        table = _read_xlsx(data)
+    else:
+        table = _read_csv(data)
+
+    if not table:
+        return [], ["файл пустой"]
+
+    idx = _header_index(table[0])
+    missing = [f for f in ("assignee", "task") if f not in idx]
+    if missing:
+        return [], [f"нет колонок: {', '.join(missing)} (нужны assignee, task; необязательны due, from)"]
+
+    def cell(row: List[str], field: str) -> str:
+        i: Optional[int] = idx.get(field)
+        if i is None or i >= len(row):
+            return ""
+        return (row[i] or "").strip()
+
+    rows: List[ImportRow] = []
+    errors: List[str] = []
+    for line_no, raw in enumerate(table[1:], start=2):
+        if not any((c or "").strip() for c in raw):
+            continue
+
+        assignee = cell(raw, "assignee")
+        task = cell(raw, "task")
+        due_raw = cell(raw, "due")
+
+        if assignee not in known_assignees:
+            errors.append(f"строка {line_no}: неизвестный исполнитель «{assignee}»")
+            continue
+        if not task:
+            errors.append(f"строка {line_no}: пустой текст задачи")
+            continue
+        due_str = ""
+        if due_raw:
+            try:
+                due_str = normalize_due_date(due_raw)
+            except ValueError:
+                errors.append(f"строка {line_no}: не распознан срок «{due_raw}»")
+                continue
+
+        rows.append(ImportRow(assignee, task, due_str, cell(raw, "from_name") or default_from))
+        if len(rows) > max_rows:
+            return [], [f"слишком много строк (максимум {max_rows})"]
+
+    return rows, errors